@@ -1,7 +1,23 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import BooleanFilter
 
-from recipes.models import Ingredient, Recipe
+from core.cache import VersionedValue
+from recipes.models import Recipe, RecipeTag, Tag
+
+
+def build_tag_ids():
+    """
+    Словарь slug → id Тегов.
+
+    Ключи в нижнем регистре: slug сравнивается без учета регистра.
+    """
+    return {slug.lower(): pk
+            for pk, slug in Tag.objects.values_list('pk', 'slug')}
+
+
+# Перестраивается, когда сигналы увеличивают версию пространства имен tags.
+tag_ids = VersionedValue('tags', build_tag_ids)
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -12,8 +28,7 @@ class RecipeFilter(django_filters.FilterSet):
     нахождении в Избранном и в Списке покупок пользователя.
     """
 
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tags__slug', lookup_expr='iexact')
+    tags = django_filters.CharFilter(method='filter_tags')
 
     is_in_shopping_cart = BooleanFilter(
         field_name='is_in_shopping_cart',
@@ -27,6 +42,22 @@ class RecipeFilter(django_filters.FilterSet):
         model = Recipe
         fields = ('tags', 'is_in_shopping_cart', 'is_favorited', 'author')
 
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов ?tags=a&tags=b.
+
+        Slug переводятся в id по словарю в памяти, а условие — EXISTS по
+        индексу (tag, recipe), поэтому Рецепты не дублируются и DISTINCT
+        не нужен.
+        """
+        ids_by_slug = tag_ids.get()
+        ids = {ids_by_slug[slug.lower()] for slug in self.data.getlist(name)
+               if slug.lower() in ids_by_slug}
+        if not ids:
+            return queryset.none()
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=ids)))
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_anonymous:
             return queryset
@@ -36,14 +67,3 @@ class RecipeFilter(django_filters.FilterSet):
         if self.request.user.is_anonymous:
             return queryset
         return queryset.filter(favorite__user=self.request.user)
-
-
-class IngredientFilter(django_filters.FilterSet):
-    """Для фильтрации по Ингредиентам."""
-
-    name = django_filters.CharFilter(
-        field_name='name', lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
@@ -0,0 +1,167 @@
+import binascii
+import os
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFile, ImageOps
+from rest_framework import serializers
+
+from core.cache import bump_version
+from recipes.models import Recipe
+
+BASE64_MARKER = ';base64,'
+# Размер части base64-строки, декодируемой за раз; кратен 4.
+DECODE_CHUNK_SIZE = 256 * 1024
+# Сколько частей ищется заголовок картинки; дальше парсер Pillow не
+# используется, иначе он копил бы в памяти всю нераспознанную строку.
+HEADER_MAX_CHUNKS = 4
+# В памяти держится не больше этого числа байт, остальное — на диске.
+SPOOL_MAX_SIZE = 1024 * 1024
+# Форматы уменьшенных копий: расширение и формат Pillow.
+VARIANT_FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+INVALID_IMAGE_MESSAGE = (
+    'Загрузите правильное изображение. Файл, который вы загрузили, '
+    'поврежден или не является изображением.')
+
+
+def check_dimensions(width, height):
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            f'Разрешение картинки {width}x{height} превышает допустимое')
+
+
+def check_size(size):
+    if size > settings.IMAGE_MAX_BYTES:
+        raise serializers.ValidationError(
+            'Размер картинки не может превышать '
+            f'{settings.IMAGE_MAX_BYTES // (1024 * 1024)} МБ')
+
+
+def decode_base64_image(data):
+    """
+    Декодирует картинку из data URI во временный файл.
+
+    Строка декодируется по частям в SpooledTemporaryFile, так что
+    целиком в памяти не копируется. Размер проверяется до декодирования,
+    а разрешение — как только из заголовка картинки известны ее размеры.
+    Заголовок ищется в первых HEADER_MAX_CHUNKS частях; остальное
+    проверяет verify_image.
+    """
+    start = data.find(BASE64_MARKER, 0, 100)
+    if start == -1:
+        raise serializers.ValidationError('Неверный формат картинки')
+    ext = data[data.find('/', 0, start) + 1:start]
+    start += len(BASE64_MARKER)
+    padding = 2 if data.endswith('==') else int(data.endswith('='))
+    check_size((len(data) - start) * 3 // 4 - padding)
+
+    parser = ImageFile.Parser()
+    file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        positions = range(start, len(data), DECODE_CHUNK_SIZE)
+        for number, position in enumerate(positions, 1):
+            chunk = binascii.a2b_base64(
+                data[position:position + DECODE_CHUNK_SIZE])
+            file.write(chunk)
+            if parser is not None:
+                parser.feed(chunk)
+                if parser.image is not None:
+                    check_dimensions(*parser.image.size)
+                    parser = None
+                elif number >= HEADER_MAX_CHUNKS:
+                    parser = None
+    except binascii.Error:
+        file.close()
+        raise serializers.ValidationError('Неверная кодировка картинки')
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        file.close()
+        raise serializers.ValidationError(INVALID_IMAGE_MESSAGE)
+    except serializers.ValidationError:
+        file.close()
+        raise
+    file.seek(0)
+    return File(file, name=f'temp.{ext}')
+
+
+def verify_image(file):
+    """
+    Проверяет, что файл — картинка допустимого размера и разрешения.
+
+    Pillow читает файл напрямую, без копии в памяти.
+    """
+    check_size(file.size)
+    try:
+        with Image.open(file) as image:
+            check_dimensions(*image.size)
+            image.verify()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise serializers.ValidationError(INVALID_IMAGE_MESSAGE)
+    file.seek(0)
+    return file
+
+
+def generate_image_variants(recipe_id):
+    """
+    Создает уменьшенные копии картинки Рецепта.
+
+    Для каждой ширины из IMAGE_VARIANT_WIDTHS, не большей исходной,
+    сохраняются WebP и JPEG, а пути записываются в Recipe.image_variants
+    вместе с именем исходного файла. Если картинку успели заменить,
+    результат отбрасывается.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants').first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = {'source': source}
+    with recipe.image.open('rb'), Image.open(recipe.image) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        widths = sorted({min(width, image.width)
+                         for width in settings.IMAGE_VARIANT_WIDTHS})
+        for ext, pillow_format in VARIANT_FORMATS:
+            variants[ext] = {}
+            for width in widths:
+                height = max(1, round(image.height * width / image.width))
+                buffer = BytesIO()
+                image.resize((width, height), Image.LANCZOS).save(
+                    buffer, pillow_format,
+                    quality=settings.IMAGE_VARIANT_QUALITY)
+                variants[ext][str(width)] = default_storage.save(
+                    f'variants/{recipe_id}/{stem}_{width}.{ext}',
+                    ContentFile(buffer.getvalue()))
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=variants)
+    stale = variants if not updated else recipe.image_variants
+    for ext, _ in VARIANT_FORMATS:
+        for name in stale.get(ext, {}).values():
+            default_storage.delete(name)
+    if updated:
+        bump_version('recipes')
+
+
+def variant_name(recipe, width=None, ext='webp'):
+    """Путь к копии картинки нужной ширины или к исходному файлу."""
+    variants = recipe.image_variants or {}
+    if variants.get('source') == recipe.image.name and variants.get(ext):
+        sizes = variants[ext]
+        width = str(width or settings.IMAGE_THUMBNAIL_WIDTH)
+        return sizes.get(width) or sizes[max(sizes, key=int)]
+    return recipe.image.name
+
+
+def srcset(recipe, build_url):
+    """Варианты картинки по форматам в виде значений атрибута srcset."""
+    variants = recipe.image_variants or {}
+    if variants.get('source') != recipe.image.name:
+        return {}
+    return {ext: ', '.join(f'{build_url(name)} {width}w'
+                           for width, name in sorted(
+                               variants.get(ext, {}).items(),
+                               key=lambda item: int(item[0])))
+            for ext, _ in VARIANT_FORMATS if variants.get(ext)}
@@ -0,0 +1,110 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import invalidate_on_commit
+from recipes.models import (Favorite, RankWatermark, Recipe, RecipeRank,
+                            ShoppingCart)
+
+RANKINGS = ('popular', 'trending')
+# Начало отсчета времени событий. Оценки хранятся без вычета текущего
+# времени: затухание одинаково для всех Рецептов и на порядок не влияет.
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+# Источник событий: модель, поле Рецепта, поле времени и вес события.
+SOURCES = (
+    ('recipe', Recipe, 'id', 'pub_date', 1.0),
+    ('favorite', Favorite, 'recipe_id', 'created', 2.0),
+    ('cart', ShoppingCart, 'recipe_id', 'created', 3.0),
+)
+
+
+def get_half_lives():
+    return {'popular': settings.RECIPE_RANK_POPULAR_HALF_LIFE,
+            'trending': settings.RECIPE_RANK_TRENDING_HALF_LIFE}
+
+
+def log2_add(a, b):
+    """log2(2 ** a + 2 ** b) без переполнения."""
+    if a is None:
+        return b
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def collect(model, recipe_field, time_field, weight, last_id, chunk_size):
+    """Оценки событий с id больше last_id, сложенные по Рецептам."""
+    half_lives = get_half_lives()
+    scores = defaultdict(dict)
+    top = last_id
+    rows = model.objects.filter(pk__gt=last_id).order_by().values_list(
+        'pk', recipe_field, time_field)
+    for pk, recipe_id, moment in rows.iterator(chunk_size=chunk_size):
+        top = max(top, pk)
+        seconds = (moment - EPOCH).total_seconds()
+        recipe = scores[recipe_id]
+        for name, half_life in half_lives.items():
+            recipe[name] = log2_add(recipe.get(name),
+                                    math.log2(weight) + seconds / half_life)
+    return scores, top
+
+
+def save_scores(scores, chunk_size):
+    """Добавляет оценки к рейтингу; Рецепты, которых уже нет, пропускает."""
+    ids = list(scores)
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        ranks = RecipeRank.objects.in_bulk(chunk)
+        alive = set(Recipe.objects.filter(pk__in=chunk).values_list(
+            'pk', flat=True))
+        created, changed = [], []
+        for recipe_id in chunk:
+            if recipe_id not in alive:
+                continue
+            rank = ranks.get(recipe_id)
+            if rank is None:
+                created.append(RecipeRank(recipe_id=recipe_id,
+                                          **scores[recipe_id]))
+                continue
+            for name, score in scores[recipe_id].items():
+                setattr(rank, name, log2_add(getattr(rank, name), score))
+            changed.append(rank)
+        RecipeRank.objects.bulk_create(created, batch_size=chunk_size,
+                                       ignore_conflicts=True)
+        RecipeRank.objects.bulk_update(changed, RANKINGS,
+                                       batch_size=chunk_size)
+
+
+@transaction.atomic
+def refresh_ranks(full=False, chunk_size=2000):
+    """
+    Добавляет в рейтинг события, появившиеся с прошлого запуска.
+
+    Для каждого источника хранится последний учтенный id, поэтому
+    читаются только новые строки. Отметки блокируются на время пересчета,
+    так что параллельные запуски выполняются по очереди. Удаления из
+    Избранного и Списков покупок, а также строки, зафиксированные не по
+    порядку id, учитывает только полный пересчет (full=True).
+    Возвращает число Рецептов с изменившейся оценкой.
+    """
+    if full:
+        RecipeRank.objects.all().delete()
+        RankWatermark.objects.all().delete()
+    totals = defaultdict(dict)
+    for source, model, recipe_field, time_field, weight in SOURCES:
+        watermark, _ = RankWatermark.objects.select_for_update(
+        ).get_or_create(source=source)
+        scores, top = collect(model, recipe_field, time_field, weight,
+                              watermark.last_id, chunk_size)
+        for recipe_id, recipe_scores in scores.items():
+            total = totals[recipe_id]
+            for name, score in recipe_scores.items():
+                total[name] = log2_add(total.get(name), score)
+        watermark.last_id = top
+        watermark.save()
+    save_scores(totals, chunk_size)
+    if totals or full:
+        invalidate_on_commit('recipes')
+    return len(totals)
@@ -0,0 +1,201 @@
+import json
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models.functions import Upper
+
+from core.cache import get_version
+from recipes.models import Ingredient
+
+INDEX_NAMESPACE = 'ingredients'
+# Порог похожести по триграммам, как similarity_threshold в pg_trgm.
+SIMILARITY_THRESHOLD = 0.3
+
+
+def render_ingredient(pk, name, measurement_unit):
+    """JSON-фрагмент Ингредиента в формате IngredientSerializer."""
+    return json.dumps({'id': pk,
+                       'name': name,
+                       'measurement_unit': measurement_unit},
+                      ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+
+def trigrams(value, padded=True):
+    """Множество триграмм строки; с дополнением пробелами, как в pg_trgm."""
+    if padded:
+        value = f'  {value} '
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def word_starts(value):
+    """Позиции начала слов, кроме первого."""
+    return [i for i in range(1, len(value))
+            if value[i].isalnum() and not value[i - 1].isalnum()]
+
+
+class IngredientIndex:
+    """
+    Индекс названий Ингредиентов в памяти процесса.
+
+    Названия в нижнем регистре хранятся в отсортированном массиве,
+    поэтому поиск по префиксу — это два бинарных поиска. Так же устроен
+    массив окончаний названий с начала каждого слова. Для поиска по
+    подстроке и похожести хранятся списки позиций по триграммам.
+    Для каждого Ингредиента заранее готов JSON-фрагмент ответа.
+    """
+
+    def __init__(self, rows, version=None):
+        rows = sorted(rows, key=lambda row: (row[1].lower(), row[0]))
+        self.version = version
+        self.keys = [name.lower() for _, name, _ in rows]
+        self.fragments = [render_ingredient(*row) for row in rows]
+        self.ids = [row[0] for row in rows]
+        self.positions = {pk: position
+                          for position, pk in enumerate(self.ids)}
+        words = []
+        postings = defaultdict(lambda: array('I'))
+        self.trigram_counts = array('H')
+        for position, key in enumerate(self.keys):
+            words.extend((key[start:], position)
+                         for start in word_starts(key))
+            grams = trigrams(key)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                postings[gram].append(position)
+        words.sort()
+        self.word_keys = [word for word, _ in words]
+        self.word_positions = array('I', (position for _, position in words))
+        self.postings = dict(postings)
+
+    @classmethod
+    def build(cls, version=None):
+        rows = Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        return cls(list(rows), version)
+
+    def prefix_range(self, prefix):
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\U0010ffff', start)
+        return start, end
+
+    def prefix_matches(self, query):
+        return range(*self.prefix_range(query))
+
+    def word_prefix_matches(self, query):
+        start = bisect_left(self.word_keys, query)
+        end = bisect_left(self.word_keys, query + '\U0010ffff', start)
+        return sorted(set(self.word_positions[start:end]))
+
+    def substring_matches(self, query):
+        grams = trigrams(query, padded=False)
+        if not grams:
+            return []
+        lists = sorted((self.postings.get(gram, ()) for gram in grams),
+                       key=len)
+        candidates = set(lists[0])
+        for positions in lists[1:]:
+            candidates.intersection_update(positions)
+            if not candidates:
+                return []
+        return sorted(position for position in candidates
+                      if query in self.keys[position])
+
+    def similar_matches(self, query):
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (len(grams) + self.trigram_counts[position]
+                                  - count)
+            if similarity >= SIMILARITY_THRESHOLD:
+                scored.append((-similarity, position))
+        return [position for _, position in sorted(scored)]
+
+    def search(self, query='', limit=None):
+        """
+        JSON-фрагменты Ингредиентов, ранжированные по совпадению с query.
+
+        Сначала названия, начинающиеся с query, затем названия, в которых
+        с query начинается одно из слов, затем содержащие query как
+        подстроку и, наконец, похожие по триграммам.
+        """
+        query = query.lower()
+        if not query:
+            return self.fragments[:limit]
+        return [self.fragments[position]
+                for position in self.rank(query, limit)]
+
+    def rank(self, query, limit=None):
+        found = []
+        seen = set()
+
+        def collect(positions):
+            for position in positions:
+                if limit is not None and len(found) >= limit:
+                    return
+                if position not in seen:
+                    seen.add(position)
+                    found.append(position)
+
+        collect(self.prefix_matches(query))
+        collect(self.word_prefix_matches(query))
+        if len(query) < 3 or (limit is not None and len(found) >= limit):
+            return found
+        if connection.vendor == 'postgresql':
+            collect(database_matches(self, query, seen, limit))
+        else:
+            collect(self.substring_matches(query))
+            collect(self.similar_matches(query))
+        return found
+
+
+def database_matches(index, query, exclude, limit):
+    """
+    Совпадения по подстроке и похожести из PostgreSQL.
+
+    Оба условия обслуживает GIN-индекс pg_trgm по UPPER(name),
+    поэтому поиск не требует последовательного чтения таблицы.
+    """
+    limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+    value = query.upper()
+    names = Ingredient.objects.annotate(search_name=Upper('name')).exclude(
+        pk__in=[index.ids[position] for position in exclude])
+    ids = list(names.filter(search_name__contains=value).order_by(
+        'search_name').values_list('pk', flat=True)[:limit])
+    if len(ids) < limit:
+        ids += names.filter(search_name__trigram_similar=value).exclude(
+            pk__in=ids).annotate(
+            similarity=TrigramSimilarity('search_name', value)).order_by(
+            '-similarity', 'search_name').values_list(
+            'pk', flat=True)[:limit - len(ids)]
+    return [index.positions[pk] for pk in ids if pk in index.positions]
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """
+    Индекс текущей версии, построенный при первом обращении.
+
+    Версия пространства имен ingredients увеличивается сигналами при
+    изменении Ингредиентов, после чего индекс перестраивается.
+    """
+    global _index
+    version = get_version(INDEX_NAMESPACE)
+    index = _index
+    if index is None or index.version != version:
+        with _lock:
+            index = _index
+            if index is None or index.version != version:
+                index = _index = IngredientIndex.build(version)
+    return index
@@ -1,20 +1,37 @@
-import base64
+import json
 import re
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
-from django.core.files.base import ContentFile
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
+from core.cache import invalidate_on_commit
+from core.metrics import SerializationTimingMixin
 from recipes.models import (Favorite, Follow, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            RecipeIngredient, RecipeTag, ShoppingCart, Tag)
+from .images import decode_base64_image, srcset, variant_name, verify_image
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    limit = request.query_params.get('recipes_limit')
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
+class ModelSerializer(SerializationTimingMixin, serializers.ModelSerializer):
+    """ModelSerializer с учетом времени сериализации в показателях запроса."""
+
+
+class UserSerializer(ModelSerializer):
     """Сериализатор отображения Пользователей."""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -30,13 +47,27 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
-        if Follow.objects.filter(follower=user,
-                                 author=obj):
-            return True
-        return False
+        return obj.id in self.get_subscriptions(user)
+
+    def get_subscriptions(self, user):
+        """
+        Множество id авторов, на которых подписан пользователь.
+
+        Загружается одним запросом и хранится в контексте, общем для всех
+        вложенных сериализаторов, поэтому список пользователей или рецептов
+        не порождает отдельный запрос на каждого автора.
+        """
+        context = self.context
+        if 'subscriptions' not in context:
+            context['subscriptions'] = set(
+                Follow.objects.filter(follower=user).values_list(
+                    'author_id', flat=True))
+        return context['subscriptions']
 
 
 class UserMeSerializer(UserSerializer):
@@ -106,7 +137,7 @@ class UserCreateSerializer(UserSerializer):
         return super(UserSerializer, self).create(validated_data)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ModelSerializer):
     """Сериализатор Тегов."""
 
     name = serializers.CharField(max_length=settings.MAX_TAG_LEN,
@@ -136,25 +167,61 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор картинок в HEX."""
+    """
+    Сериализатор картинок в HEX.
+
+    Принимает data URI в base64 или загруженный файл multipart/form-data.
+    Размер и разрешение ограничены IMAGE_MAX_BYTES и IMAGE_MAX_PIXELS.
+    """
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
+            data = decode_base64_image(data)
+        file = serializers.FileField.to_internal_value(self, data)
+        return verify_image(file)
 
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
 
-        return super().to_internal_value(data)
+class RecipeImageField(serializers.ImageField):
+    """
+    Картинка Рецепта для чтения.
+
+    С thumbnail=True или флагом thumbnails в контексте отдается
+    уменьшенная копия, если она уже готова, иначе исходная картинка.
+    """
 
+    def __init__(self, thumbnail=False, **kwargs):
+        self.thumbnail = thumbnail
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
 
-class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
+    def build_url(self, value, name):
+        url = value.storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        if self.thumbnail or self.context.get('thumbnails'):
+            return self.build_url(value, variant_name(value.instance))
+        return super().to_representation(value)
+
+
+class ImageSrcsetField(RecipeImageField):
+    """Готовые копии картинки Рецепта по форматам в виде srcset."""
+
+    def to_representation(self, value):
+        if not value:
+            return {}
+        return srcset(value.instance,
+                      lambda name: self.build_url(value, name))
+
+
+class RecipeIngredientCreateSerializer(ModelSerializer):
     """Вспомогательный сериализатор создания Рецепт/Ингредиент."""
 
-    id = serializers.PrimaryKeyRelatedField(source='ingredient.id',
-                                            queryset=Ingredient.objects.all(),
-                                            required=True,
-                                            )
+    id = serializers.IntegerField(source='ingredient.id',
+                                  required=True,)
     name = serializers.CharField(source='ingredient.name',
                                  required=False)
     amount = serializers.IntegerField(required=True,
@@ -163,8 +230,6 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         source='ingredient.measurement_unit',
         required=False)
 
-    unique_set = set()
-
     class Meta:
         model = RecipeIngredient
         fields = ('id',
@@ -175,28 +240,35 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     def validate_amount(self, amount):
         """Валидация Количества Ингредиента."""
         if amount < 1:
-            self.unique_set.clear()
             raise serializers.ValidationError(
                 'Количество не может быть менее 1')
         return amount
 
-    def validate(self, attrs):
-        ingredient = attrs.get('ingredient').get('id').id
-        if ingredient in self.unique_set:
-            self.unique_set.clear()
-            raise serializers.ValidationError(
-                'Ингредиенты не могут повторяться!')
-        self.unique_set.add(ingredient)
-        return attrs
 
+def resolve_ids(model, ids, duplicate_message, missing_message):
+    """
+    Объекты model по списку id, загруженные одним запросом.
 
-class RecipeSerializer(serializers.ModelSerializer):
+    Повторы и несуществующие id приводят к ошибке валидации.
+    """
+    if len(set(ids)) != len(ids):
+        raise serializers.ValidationError(duplicate_message)
+    objects = model.objects.in_bulk(ids)
+    missing = [pk for pk in ids if pk not in objects]
+    if missing:
+        raise serializers.ValidationError(
+            f'{missing_message}: {", ".join(map(str, missing))}')
+    return [objects[pk] for pk in ids]
+
+
+class RecipeSerializer(ModelSerializer):
     """Сериалайзер отображения Рецепта."""
 
     ingredients = RecipeIngredientCreateSerializer(source='recipeingredient',
                                                    many=True)
     tags = TagSerializer(many=True)
-    image = Base64ImageField(required=False, allow_null=True)
+    image = RecipeImageField()
+    image_srcset = ImageSrcsetField(source='image')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     author = UserSerializer()
@@ -210,6 +282,7 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'image_srcset',
                   'text',
                   'cooking_time',
                   )
@@ -218,6 +291,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Получение нахождения в Избранном."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -226,6 +301,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Получение нахождения в Списке покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -233,11 +310,10 @@ class RecipeSerializer(serializers.ModelSerializer):
         return favorite.exists()
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(ModelSerializer):
     """Сериалайзер создания Рецепта."""
 
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = RecipeIngredientCreateSerializer(source='recipeingredient',
                                                    many=True,
                                                    required=True,
@@ -261,25 +337,51 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'author')
         model = Recipe
 
+    def to_internal_value(self, data):
+        """
+        Приводит данные multipart/form-data к виду JSON-запроса.
+
+        Теги передаются повторяющимся полем tags, ингредиенты — JSON-строкой.
+        """
+        if hasattr(data, 'getlist'):
+            form = {key: data.get(key) for key in data}
+            if 'tags' in data:
+                form['tags'] = data.getlist('tags')
+            if isinstance(form.get('ingredients'), str):
+                try:
+                    form['ingredients'] = json.loads(form['ingredients'])
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {'ingredients': ['Ожидается JSON-список.']})
+            data = form
+        return super().to_internal_value(data)
+
     def validate_ingredients(self, ingredients):
-        """Валидация ингредиентов."""
-        RecipeIngredientCreateSerializer.unique_set.clear()
+        """
+        Валидация ингредиентов.
+
+        Все Ингредиенты загружаются одним запросом и подставляются
+        в данные вместо id.
+        """
         if not ingredients:
             raise serializers.ValidationError(
                 'Ингредиенты не могут отсутствовать.')
+        resolved = resolve_ids(
+            Ingredient,
+            [item['ingredient']['id'] for item in ingredients],
+            'Ингредиенты не могут повторяться!',
+            'Ингредиенты не существуют')
+        for item, ingredient in zip(ingredients, resolved):
+            item['ingredient'] = ingredient
         return ingredients
 
     def validate_tags(self, tags):
-        """Валидация Тэгов."""
-        unique = set()
-        for tag in tags:
-            if tag.id in unique:
-                raise serializers.ValidationError('tag не могут повторяться')
-            unique.add(tag.id)
+        """Валидация Тэгов; все Теги загружаются одним запросом."""
         if not tags:
             raise serializers.ValidationError(
                 'Теги не могут отсутствовать')
-        return tags
+        return resolve_ids(Tag, tags, 'tag не могут повторяться',
+                           'Теги не существуют')
 
     def validate(self, attrs):
         if 'tags' not in attrs:
@@ -293,6 +395,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Получение нахождения в Избранном."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -301,6 +405,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Получение нахождения в Списке покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -312,10 +418,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         for item in items:
             ingredients.append(
                 RecipeIngredient(recipe=instance,
-                                 ingredient=item.get('ingredient').get('id'),
+                                 ingredient=item['ingredient'],
                                  amount=item['amount']))
         RecipeIngredient.objects.bulk_create(ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Кастомная функция создания рецепта."""
         items = validated_data.pop('recipeingredient')
@@ -323,34 +430,90 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.create_ingredient(items, instance)
         return instance
 
+    def update_ingredients(self, items, instance):
+        """
+        Приводит ингредиенты рецепта к items, меняя только отличия.
+
+        Текущие ингредиенты берутся из предвыборки, сделанной вьюсетом
+        при загрузке рецепта. Возвращает id созданных, измененных
+        и удаленных ингредиентов.
+        """
+        existing = {item.ingredient_id: item
+                    for item in instance.recipeingredient.all()}
+        incoming = {item['ingredient'].id: item for item in items}
+        deleted = [pk for pk in existing if pk not in incoming]
+        created = [pk for pk in incoming if pk not in existing]
+        updated = []
+        for pk, item in incoming.items():
+            current = existing.get(pk)
+            if current is not None and current.amount != item['amount']:
+                current.amount = item['amount']
+                updated.append(current)
+        if deleted:
+            RecipeIngredient.objects.filter(
+                recipe=instance, ingredient_id__in=deleted).delete()
+        if updated:
+            RecipeIngredient.objects.bulk_update(updated, ['amount'])
+        if created:
+            self.create_ingredient([incoming[pk] for pk in created],
+                                   instance)
+        return {'created': created,
+                'updated': [item.ingredient_id for item in updated],
+                'deleted': deleted}
+
+    def update_tags(self, tags, instance):
+        """Приводит теги рецепта к tags; возвращает добавленные и удаленные."""
+        existing = {tag.id for tag in instance.tags.all()}
+        incoming = {tag.id for tag in tags}
+        deleted = sorted(existing - incoming)
+        created = sorted(incoming - existing)
+        if deleted:
+            RecipeTag.objects.filter(recipe=instance,
+                                     tag_id__in=deleted).delete()
+        if created:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=instance, tag_id=pk) for pk in created)
+        return {'created': created, 'deleted': deleted}
+
+    @transaction.atomic
     def update(self, instance, validated_data):
+        """
+        Обновление рецепта по разнице с текущим состоянием.
+
+        Изменения ингредиентов и тегов сохраняются в self.changes.
+        """
         items = validated_data.pop('recipeingredient')
-        RecipeIngredient.objects.filter(recipe=instance).delete()
+        tags = validated_data.pop('tags')
         instance = super().update(instance, validated_data)
-        self.create_ingredient(items, instance)
+        self.changes = {
+            'ingredients': self.update_ingredients(items, instance),
+            'tags': self.update_tags(tags, instance),
+        }
+        if any(any(diff.values()) for diff in self.changes.values()):
+            # bulk_update и bulk_create не отправляют сигналы.
+            invalidate_on_commit('recipes')
         return instance
 
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['tags'] = TagSerializer(
-            instance.tags,
-            many=True,).data
-        return representation
+        instance = Recipe.objects.for_read(
+            self.context.get('request').user).get(pk=instance.pk)
+        return RecipeSerializer(instance, context=self.context).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(ModelSerializer):
     """Сериалайзер добавления Рецепта в Избранном."""
 
     name = serializers.StringRelatedField(source='recipe.name')
     cooking_time = serializers.IntegerField(source='recipe.cooking_time',
                                             read_only=True)
-    image = Base64ImageField(required=False,
-                             allow_null=True,
-                             source='recipe.image')
+    image = RecipeImageField(thumbnail=True, source='recipe.image')
+    image_srcset = ImageSrcsetField(source='recipe.image')
 
     class Meta:
-        fields = ('user', 'recipe', 'id', 'name', 'image', 'cooking_time')
-        read_only_fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('user', 'recipe', 'id', 'name', 'image', 'image_srcset',
+                  'cooking_time')
+        read_only_fields = ('id', 'name', 'image', 'image_srcset',
+                            'cooking_time')
         model = Favorite
 
         extra_kwargs = {'user': {'write_only': True},
@@ -370,7 +533,23 @@ class FavoriteSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class RecipeFollowSerializer(ModelSerializer):
+    """Сериалайзер краткого отображения Рецепта в Подписках."""
+
+    image = RecipeImageField(thumbnail=True)
+    image_srcset = ImageSrcsetField(source='image')
+
+    class Meta:
+        fields = ('id',
+                  'name',
+                  'image',
+                  'image_srcset',
+                  'cooking_time')
+        read_only_fields = fields
+        model = Recipe
+
+
+class FollowSerializer(ModelSerializer):
     """Сериалайзер добавления Автора в Подписку."""
 
     id = serializers.PrimaryKeyRelatedField(source='author',
@@ -405,21 +584,26 @@ class FollowSerializer(serializers.ModelSerializer):
         model = Follow
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(follower=self.context.get('request').user,
-                                     author=obj.author).exists()
+        """Автор из Подписок всегда подписан текущим пользователем."""
+        return True
 
     def get_recipes(self, obj):
-        limit = self.context.get('request').query_params.get('recipes_limit')
-        recipes = obj.author.recipe.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        """Рецепты автора, ограниченные параметром recipes_limit."""
+        author = obj.author
+        if hasattr(author, 'feed_recipes'):
+            recipes = author.feed_recipes
+        else:
+            recipes = author.recipe.order_by('-pub_date')
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
         serializer = RecipeFollowSerializer(recipes,
-                                            read_only=True,
-                                            many=True)
+                                            many=True,
+                                            context=self.context)
         return serializer.data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipe.all().count()
+        return obj.author.recipes_count
 
     def validate(self, attrs):
         author_id = int(self.context.get(
@@ -434,7 +618,7 @@ class FollowSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(ModelSerializer):
     """Сериалайзер Ингредиентов."""
 
     class Meta:
@@ -444,7 +628,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class ShoppingCartSerializer(ModelSerializer):
     """Сериалайзер добавления Рецепта в Список покупок."""
 
     id = serializers.PrimaryKeyRelatedField(source='recipe', read_only=True)
@@ -452,19 +636,20 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     cooking_time = serializers.IntegerField(source='recipe.cooking_time',
                                             required=False,
                                             read_only=True)
-    image = Base64ImageField(source='recipe.image',
-                             required=False,
-                             allow_null=True)
+    image = RecipeImageField(thumbnail=True, source='recipe.image')
+    image_srcset = ImageSrcsetField(source='recipe.image')
 
     class Meta:
         fields = ('id',
                   'name',
                   'image',
+                  'image_srcset',
                   'cooking_time'
                   )
         read_only_fields = ('id',
                             'name',
                             'image',
+                            'image_srcset',
                             'cooking_time'
                             )
         model = ShoppingCart
@@ -0,0 +1,122 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from api.images import generate_image_variants
+from core.cache import invalidate_on_commit
+from core.tasks import run_in_background
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, RecipeRank, RecipeTag,
+                            ShoppingCart, Tag)
+
+User = get_user_model()
+
+RECIPE_MODELS = (Recipe, RecipeTag, RecipeIngredient, Tag, Ingredient, User)
+
+# Счетчики: модель строк, поле связи, модель владельца и имя счетчика.
+COUNTERS = (
+    (Favorite, 'recipe', Recipe, 'favorites_count'),
+    (ShoppingCart, 'recipe', Recipe, 'in_carts_count'),
+    (Recipe, 'author', User, 'recipes_count'),
+    (Follow, 'author', User, 'followers_count'),
+)
+
+
+def invalidate_recipes(sender, update_fields=None, **kwargs):
+    """Сбрасывает кэш ответов по Рецептам при изменении их данных."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_on_commit('recipes')
+
+
+def invalidate_recipes_m2m(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_on_commit('recipes')
+
+
+def invalidate_ingredients(sender, **kwargs):
+    """Сбрасывает индекс Ингредиентов при изменении справочника."""
+    invalidate_on_commit('ingredients')
+
+
+def invalidate_tags(sender, **kwargs):
+    """Сбрасывает словарь slug → id Тегов при изменении Тегов."""
+    invalidate_on_commit('tags')
+
+
+def invalidate_cart(sender, instance, **kwargs):
+    """Отмечает изменение Списка покупок пользователя."""
+    invalidate_on_commit(f'cart:{instance.user_id}')
+
+
+def schedule_image_variants(sender, instance, **kwargs):
+    """Ставит в очередь создание копий новой картинки Рецепта."""
+    if (instance.image
+            and instance.image.name != instance.image_variants.get('source')):
+        run_in_background(generate_image_variants, instance.pk)
+
+
+def change_counters(sender, instance, delta):
+    """
+    Изменяет счетчики владельцев строки на delta.
+
+    UPDATE с F() выполняется в транзакции записи строки и не теряет
+    конкурентные изменения; счетчик не опускается ниже нуля. UPDATE не
+    отправляет сигналов, поэтому кэш ответов по Рецептам, где видны
+    счетчики и сортировка по ним, сбрасывается здесь.
+    """
+    for model, field, owner, counter in COUNTERS:
+        if model is sender:
+            owner.objects.filter(pk=getattr(instance, f'{field}_id')).update(
+                **{counter: Greatest(F(counter) + delta, 0)})
+            invalidate_on_commit('recipes')
+
+
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counters(sender, instance, 1)
+
+
+def count_deleted(sender, instance, **kwargs):
+    change_counters(sender, instance, -1)
+
+
+def create_rank(sender, instance, created, raw=False, **kwargs):
+    """Добавляет новый Рецепт в рейтинг с нулевыми оценками."""
+    if created and not raw:
+        RecipeRank.objects.get_or_create(recipe=instance)
+
+
+def connect_signals():
+    for model in RECIPE_MODELS:
+        post_save.connect(invalidate_recipes, sender=model,
+                          dispatch_uid=f'invalidate_recipes_{model.__name__}')
+        post_delete.connect(
+            invalidate_recipes, sender=model,
+            dispatch_uid=f'invalidate_recipes_delete_{model.__name__}')
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        m2m_changed.connect(
+            invalidate_recipes_m2m, sender=through,
+            dispatch_uid=f'invalidate_recipes_m2m_{through.__name__}')
+    post_save.connect(invalidate_ingredients, sender=Ingredient,
+                      dispatch_uid='invalidate_ingredients')
+    post_delete.connect(invalidate_ingredients, sender=Ingredient,
+                        dispatch_uid='invalidate_ingredients_delete')
+    post_save.connect(invalidate_tags, sender=Tag,
+                      dispatch_uid='invalidate_tags')
+    post_delete.connect(invalidate_tags, sender=Tag,
+                        dispatch_uid='invalidate_tags_delete')
+    post_save.connect(invalidate_cart, sender=ShoppingCart,
+                      dispatch_uid='invalidate_cart')
+    post_delete.connect(invalidate_cart, sender=ShoppingCart,
+                        dispatch_uid='invalidate_cart_delete')
+    post_save.connect(schedule_image_variants, sender=Recipe,
+                      dispatch_uid='schedule_image_variants')
+    for model, _, _, counter in COUNTERS:
+        post_save.connect(count_created, sender=model,
+                          dispatch_uid=f'count_created_{counter}')
+        post_delete.connect(count_deleted, sender=model,
+                            dispatch_uid=f'count_deleted_{counter}')
+    post_save.connect(create_rank, sender=Recipe,
+                      dispatch_uid='create_rank')
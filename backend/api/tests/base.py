@@ -0,0 +1,53 @@
+import random
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from core.benchmark import (LOCAL_CACHES, Scenario, call_api, clear_caches,
+                            get_client, seed)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(CACHES=LOCAL_CACHES, MEDIA_ROOT=MEDIA_ROOT,
+                   QUERY_BUDGET_STRICT=False)
+class QueryCountTestCase(TestCase):
+    """
+    Синтетические данные и подсчет запросов к БД при вызовах API.
+
+    Данные и сценарий — core.benchmark, общие с командой query_budgets.
+    Перед каждым вызовом кэши очищаются, поэтому считаются запросы
+    без кэша.
+    """
+
+    small = 20
+    large = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(0)
+        seed(cls.small)
+        cls.scenario = Scenario()
+        cls.user = cls.scenario.user
+        cls.author = cls.scenario.author
+        cls.recipe = cls.scenario.recipe
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def grow(self):
+        """Доводит число синтетических Рецептов до large."""
+        self.scenario.grow(self.large - self.small)
+
+    def get_client(self, user=None):
+        return get_client(user)
+
+    def clear_caches(self):
+        clear_caches()
+
+    def call(self, method, path, data=None, user=None):
+        """Ответ на вызов API и число выполненных запросов к БД."""
+        return call_api(method, path, data, user)
@@ -0,0 +1,36 @@
+import base64
+import struct
+import zlib
+
+from django.test import SimpleTestCase
+from rest_framework import serializers
+
+from api.images import decode_base64_image, verify_image
+
+
+def png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+def data_uri(data):
+    return 'data:image/png;base64,' + base64.b64encode(data).decode()
+
+
+class DecodeImageTests(SimpleTestCase):
+    """Картинки в base64 из запросов."""
+
+    def assertInvalid(self, data):
+        with self.assertRaises(serializers.ValidationError):
+            verify_image(decode_base64_image(data_uri(data)))
+
+    def test_decompression_bomb(self):
+        """Маленький PNG с огромным заявленным разрешением."""
+        header = struct.pack('>IIBBBBB', 20000, 10000, 8, 2, 0, 0, 0)
+        self.assertInvalid(
+            b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', header)
+            + png_chunk(b'IDAT', zlib.compress(b'\0' * 2000, 9))
+            + png_chunk(b'IEND', b''))
+
+    def test_not_an_image(self):
+        self.assertInvalid(b'x' * 3 * 1024 * 1024)
@@ -0,0 +1,35 @@
+from core.benchmark import compare, measure
+from .base import QueryCountTestCase
+
+
+class QueryBudgetTests(QueryCountTestCase):
+    """
+    Число запросов к БД маршрутов API не растет с данными и не
+    превышает бюджет QUERY_BUDGETS.
+
+    Каждый вызов сценария core.benchmark выполняется при small и при
+    large Рецептов; рост числа запросов означает N+1 в сериализаторе
+    или вьюсете.
+    """
+
+    def assertBounded(self, get_calls):
+        """Проверяет вызовы get_calls(label) при small и large Рецептов."""
+        small = measure(get_calls('small'))
+        self.grow()
+        large = measure(get_calls('large'))
+        for key, route, method, before, after, problems in compare(
+                small, large):
+            with self.subTest(key, route=route, method=method,
+                              queries=(before, after)):
+                self.assertEqual(problems, [])
+
+    def test_anonymous_reads(self):
+        self.assertBounded(lambda label: self.scenario.read_calls(None))
+
+    def test_user_reads(self):
+        self.assertBounded(
+            lambda label: self.scenario.read_calls(self.user)
+            + self.scenario.user_calls())
+
+    def test_writes(self):
+        self.assertBounded(self.scenario.write_calls)
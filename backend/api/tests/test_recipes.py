@@ -0,0 +1,34 @@
+from core.cache import get_version
+from .base import QueryCountTestCase
+
+
+class RecipeListTests(QueryCountTestCase):
+    """Список Рецептов."""
+
+    def test_queries_do_not_depend_on_page_size(self):
+        """Флаги Избранного и Списка покупок не запрашиваются по Рецепту."""
+        for user in (None, self.user):
+            with self.subTest(user=user):
+                response, expected = self.call(
+                    'get', '/api/recipes/?limit=2', user=user)
+                self.assertEqual(len(response.json()['results']), 2)
+                client = self.get_client(user)
+                self.clear_caches()
+                with self.assertNumQueries(expected):
+                    response = client.get('/api/recipes/?limit=20')
+                self.assertEqual(len(response.json()['results']), 20)
+
+
+class RecipeCounterTests(QueryCountTestCase):
+    """Счетчики Избранного и Списков покупок."""
+
+    def test_counter_change_invalidates_cached_recipes(self):
+        client = self.get_client(self.user)
+        for action in ('favorite', 'shopping_cart'):
+            with self.subTest(action):
+                version = get_version('recipes')
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = client.post(
+                        f'/api/recipes/{self.recipe.pk}/{action}/')
+                self.assertEqual(response.status_code, 201)
+                self.assertGreater(get_version('recipes'), version)
@@ -1,16 +1,160 @@
+import csv
+import hashlib
+import json
+import os
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
 from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 
+from core.cache import get_version
+from core.concurrency import AsyncViewMixin, gather, run_sync
 from recipes.models import RecipeIngredient, ShoppingCart
 
 
-class DownloadViewSet(APIView):
-    """Вьюсет для скачивания списка покупок."""
+class ShoppingCartRenderer:
+    """
+    Базовый формат файла списка покупок.
+
+    render получает итератор словарей с полями ingredient__name,
+    ingredient__measurement_unit и total_amount и отдает части файла.
+    """
+
+    format = None
+    content_type = None
+
+    def render(self, items):
+        raise NotImplementedError
+
+
+def format_item(item):
+    return (f"- {item['ingredient__name']} "
+            f"({item['ingredient__measurement_unit']}): "
+            f"{item['total_amount']}")
+
+
+class TextRenderer(ShoppingCartRenderer):
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def render(self, items):
+        yield 'Список покупок' + '\n' + '\n'
+        for item in items:
+            yield format_item(item) + '\n'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(ShoppingCartRenderer):
+    format = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def render(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in items:
+            yield writer.writerow((item['ingredient__name'],
+                                   item['ingredient__measurement_unit'],
+                                   item['total_amount']))
+
+
+class JSONRenderer(ShoppingCartRenderer):
+    format = 'json'
+    content_type = 'application/json'
+
+    def render(self, items):
+        separator = '['
+        for item in items:
+            yield separator + json.dumps(
+                {'name': item['ingredient__name'],
+                 'measurement_unit': item['ingredient__measurement_unit'],
+                 'amount': item['total_amount']},
+                ensure_ascii=False)
+            separator = ','
+        yield ']' if separator == ',' else '[]'
+
+
+class PDFRenderer(ShoppingCartRenderer):
+    """PDF-файл; для кириллицы нужен TTF-шрифт SHOPPING_CART_PDF_FONT."""
+
+    format = 'pdf'
+    content_type = 'application/pdf'
+
+    def render(self, items):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+
+        font = 'Helvetica'
+        if os.path.exists(settings.SHOPPING_CART_PDF_FONT):
+            font = 'ShoppingCartFont'
+            pdfmetrics.registerFont(
+                TTFont(font, settings.SHOPPING_CART_PDF_FONT))
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        y = height - 60
+        pdf.setFont(font, 16)
+        pdf.drawString(50, y, 'Список покупок')
+        pdf.setFont(font, 12)
+        for item in items:
+            y -= 20
+            if y < 50:
+                pdf.showPage()
+                pdf.setFont(font, 12)
+                y = height - 50
+            pdf.drawString(50, y, format_item(item))
+        pdf.save()
+        yield buffer.getvalue()
+
+
+class DownloadViewSet(AsyncViewMixin, APIView):
+    """
+    Вьюсет для скачивания списка покупок.
+
+    Формат файла задается параметром format (txt, csv, json, pdf).
+    ETag строится по составу Списка покупок и версии данных Рецептов,
+    поэтому повторное скачивание неизменного списка получает ответ 304
+    без агрегации по RecipeIngredient.
+
+    Под ASGI файл собирается в пуле потоков целиком: при потоковой
+    отдаче чтение из БД шло бы в цикле событий.
+    """
 
     permission_classes = (IsAuthenticated,)
+    default_format = 'txt'
+
+    @cached_property
+    def renderers(self):
+        renderers = (import_string(path)()
+                     for path in settings.SHOPPING_CART_RENDERERS)
+        return {renderer.format: renderer for renderer in renderers}
+
+    def perform_content_negotiation(self, request, force=False):
+        # Параметр format выбирает формат файла, а не рендерер DRF.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get_renderer(self, request):
+        cart_format = request.query_params.get('format', self.default_format)
+        if cart_format not in self.renderers:
+            raise NotFound(f'Формат {cart_format} не поддерживается')
+        return self.renderers[cart_format]
 
     def merge_shopping_cart(self):
         """Генерирует список словарей с покупками."""
@@ -26,17 +170,57 @@ class DownloadViewSet(APIView):
         ).order_by('ingredient__name')
         return items
 
+    def get_etag(self, request, renderer):
+        recipes = ShoppingCart.objects.filter(user=request.user).order_by(
+            'recipe_id').values_list('recipe_id', flat=True)
+        state = ','.join(map(str, recipes))
+        digest = hashlib.md5(
+            f'{state}|{get_version("recipes")}|{renderer.format}'.encode()
+        ).hexdigest()
+        return f'"{digest}"'
+
+    def get_last_modified(self, request):
+        version = max(get_version(f'cart:{request.user.id}'),
+                      get_version('recipes'))
+        return version // 1000
+
     def get(self, request):
-        """Возвращает текстовый файл из списка покупок."""
-        items = self.merge_shopping_cart()
-        text = ['Список покупок' + '\n' + '\n']
-        for item in items:
-            text.append(f"- {item['ingredient__name']} "
-                        f"({item['ingredient__measurement_unit']}): "
-                        f"{item['total_amount']}\n")
-        response = HttpResponse(content_type='text/plain',
-                                status=status.HTTP_200_OK)
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename=shopping_cart.txt')
-        response.writelines(text)
+        """Возвращает файл из списка покупок."""
+        renderer = self.get_renderer(request)
+        etag = self.get_etag(request, renderer)
+        last_modified = self.get_last_modified(request)
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is not None:
+            return response
+        return self.file_response(renderer, self.render_file(renderer),
+                                  etag, last_modified)
+
+    async def async_get(self, request):
+        renderer = self.get_renderer(request)
+        etag, last_modified = await gather(
+            partial(self.get_etag, request, renderer),
+            partial(self.get_last_modified, request))
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is not None:
+            return response
+        content = await run_sync(lambda: list(self.render_file(renderer)))
+        return self.file_response(renderer, content, etag, last_modified)
+
+    def render_file(self, renderer):
+        """Части файла списка покупок; БД читается по мере отдачи."""
+        items = self.merge_shopping_cart().iterator(
+            chunk_size=settings.SHOPPING_CART_CHUNK_SIZE)
+        return renderer.render(items)
+
+    def file_response(self, renderer, content, etag, last_modified):
+        response = StreamingHttpResponse(content,
+                                         content_type=renderer.content_type,
+                                         status=status.HTTP_200_OK)
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename=shopping_cart.{renderer.format}')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
         return response
@@ -1,21 +1,36 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.cache import (AnonymousCacheMixin, ReferenceCacheMixin,
+                        VersionedValue)
+from core.concurrency import AsyncViewMixin, gather, run_sync
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
 from recipes.models import (Favorite, Follow, Ingredient, Recipe, ShoppingCart,
-                            Tag)
-from .filters import IngredientFilter, RecipeFilter
+                            Tag, read_prefetches)
+from .filters import RecipeFilter
 from .permissions import IsOwnerOrReadOnly
+from .ranking import RANKINGS
+from .search import get_ingredient_index
 from .serializers import (FavoriteSerializer, FollowSerializer,
                           IngredientSerializer, RecipeCreateSerializer,
                           RecipeSerializer, ShoppingCartSerializer,
-                          TagSerializer, UserMeSerializer, UserSerializer)
+                          TagSerializer, UserMeSerializer, UserSerializer,
+                          get_recipes_limit)
 
 User = get_user_model()
 
@@ -51,8 +66,48 @@ class UserMe(APIView):
         return self.get(request)
 
 
-class TagsViewSet(viewsets.ModelViewSet):
-    """Вьюсет для Тэгов."""
+def render_tags():
+    """JSON-байты списка Тегов и каждого Тега по id."""
+    renderer = FastJSONRenderer()
+    tags = TagSerializer(Tag.objects.order_by('pk'), many=True).data
+    return renderer.render(tags), {tag['id']: renderer.render(tag)
+                                   for tag in tags}
+
+
+# Перестраивается, когда сигналы увеличивают версию пространства имен tags.
+rendered_tags = VersionedValue('tags', render_tags)
+
+
+def parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise NotFound()
+
+
+class AsyncReferenceMixin(AsyncViewMixin):
+    """
+    Асинхронные list и retrieve справочников.
+
+    Ответ обычно берется из памяти процесса, но при смене версии
+    справочник пересобирается запросом к БД, поэтому обработчик
+    выполняется в пуле потоков.
+    """
+
+    async def async_list(self, request, *args, **kwargs):
+        return await run_sync(self.list, request, *args, **kwargs)
+
+    async def async_retrieve(self, request, *args, **kwargs):
+        return await run_sync(self.retrieve, request, *args, **kwargs)
+
+
+class TagsViewSet(AsyncReferenceMixin, ReferenceCacheMixin,
+                  viewsets.ModelViewSet):
+    """
+    Вьюсет для Тэгов.
+
+    Отвечает готовыми JSON-байтами из памяти процесса с ETag.
+    """
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -61,17 +116,75 @@ class TagsViewSet(viewsets.ModelViewSet):
                           IsOwnerOrReadOnly)
     http_method_names = ['get']
     pagination_class = None
+    cache_namespace = 'tags'
 
+    def list(self, request, *args, **kwargs):
+        return self.reference_response(
+            request, lambda: rendered_tags.get()[0])
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    """Вьюсет для рецептов."""
+    def retrieve(self, request, *args, **kwargs):
+        pk = parse_id(self.kwargs[self.lookup_field])
+
+        def render():
+            tags = rendered_tags.get()[1]
+            if pk not in tags:
+                raise NotFound()
+            return tags[pk]
+
+        return self.reference_response(request, render)
+
+
+class RecipeViewSet(AsyncViewMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
+    """
+    Вьюсет для рецептов.
+
+    Под ASGI list и retrieve для пользователя загружают Рецепты, а затем
+    одновременно — их Теги, Ингредиенты и подписки пользователя.
+    """
 
-    queryset = Recipe.objects.all().order_by('-pub_date')
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,
                           IsOwnerOrReadOnly)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    parser_classes = (FastJSONParser, MultiPartParser, FormParser)
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
+    ordering = ('-pub_date',)
+    cache_namespace = 'recipes'
+    # Предвыборки выполняет load_related, а не запрос списка.
+    deferred_prefetch = False
+
+    @property
+    def ranking(self):
+        """Рейтинг из параметра ordering=popular|trending или None."""
+        ranking = self.request.query_params.get('ordering')
+        return ranking if ranking in RANKINGS else None
+
+    @property
+    def cursor_ordering(self):
+        """
+        Сортировка из параметра ordering, дополненная id.
+
+        По ней же строится ключ курсора, поэтому сортировка по
+        популярности листается так же, как по дате.
+        """
+        if self.ranking:
+            return (f'-{self.ranking}_score', '-id')
+        ordering = OrderingFilter().get_ordering(
+            self.request, Recipe.objects.none(), self)
+        return (*ordering, '-id')
+
+    def get_queryset(self):
+        recipes = Recipe.objects.for_read(self.request.user)
+        if self.deferred_prefetch:
+            recipes = recipes.prefetch_related(None)
+        if self.ranking:
+            # Строка рейтинга есть у каждого Рецепта, поэтому соединение
+            # внутреннее и сортировка идет по индексу оценки.
+            recipes = recipes.filter(rank__isnull=False).annotate(**{
+                f'{self.ranking}_score': F(f'rank__{self.ranking}')})
+        return recipes.order_by(*self.cursor_ordering)
 
     def get_serializer_class(self):
         if self.request.user.is_anonymous:
@@ -80,12 +193,67 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateSerializer
         return super().get_serializer_class()
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # В списке Рецептов вместо исходных картинок — уменьшенные копии.
+        context['thumbnails'] = self.action == 'list'
+        return context
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     def perform_update(self, serializer):
         serializer.save(author=self.request.user)
 
+    async def load_related(self, recipes):
+        """
+        Одновременно загружает Теги, Ингредиенты и подписки пользователя.
+
+        Возвращает контекст сериализатора с загруженными подписками.
+        """
+        context = self.get_serializer_context()
+        for recipe in recipes:
+            # Словарь предвыборок создается заранее, иначе параллельные
+            # prefetch_related_objects заменят словари друг друга.
+            recipe._prefetched_objects_cache = {}
+        loaders = [partial(prefetch_related_objects, recipes, lookup)
+                   for lookup in read_prefetches()]
+        if not self.request.user.is_anonymous:
+            loaders.append(partial(
+                UserSerializer(context=context).get_subscriptions,
+                self.request.user))
+        await gather(*loaders)
+        return context
+
+    async def async_list(self, request, *args, **kwargs):
+        if request.user.is_anonymous:
+            # Анонимный ответ обычно берется из кэша целиком.
+            return await run_sync(self.list, request, *args, **kwargs)
+        self.deferred_prefetch = True
+
+        def load_page():
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            return (list(queryset), False) if page is None else (page, True)
+
+        recipes, paginated = await run_sync(load_page)
+        context = await self.load_related(recipes)
+        data = await run_sync(lambda: self.get_serializer(
+            recipes, many=True, context=context).data)
+        if paginated:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    async def async_retrieve(self, request, *args, **kwargs):
+        if request.user.is_anonymous:
+            return await run_sync(self.retrieve, request, *args, **kwargs)
+        self.deferred_prefetch = True
+        recipe = await run_sync(self.get_object)
+        context = await self.load_related([recipe])
+        data = await run_sync(lambda: self.get_serializer(
+            recipe, context=context).data)
+        return Response(data)
+
 
 class BaseViewset(viewsets.ModelViewSet):
     """Базовая модель для Подписки, Избранное, Списка покупок."""
@@ -96,6 +264,7 @@ class BaseViewset(viewsets.ModelViewSet):
     def _get_title(self, title_model):
         return get_object_or_404(title_model, id=self._get_title_id())
 
+    @transaction.atomic
     def perform_create(self, serializer):
         recipe = self._get_title(self.title_model)
         serializer.save(user=self.request.user,
@@ -104,6 +273,7 @@ class BaseViewset(viewsets.ModelViewSet):
     @action(methods=['delete'],
             detail=True,
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def delete(self, request, *args, **kwargs):
         recipe = self._get_title(self.title_model)
         model_items = self.model.objects.filter(recipe=recipe,
@@ -147,6 +317,7 @@ class FollowViewSet(BaseViewset):
     model = Follow
     title_model = User
 
+    @transaction.atomic
     def perform_create(self, serializer):
         author = self._get_title(self.title_model)
         serializer.save(follower=self.request.user,
@@ -155,6 +326,7 @@ class FollowViewSet(BaseViewset):
     @action(methods=['delete'],
             detail=True,
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def delete(self, request, *args, **kwargs):
         author = self._get_title(self.title_model)
         model_items = self.model.objects.filter(author=author,
@@ -172,14 +344,33 @@ class FollowListViewSet(mixins.ListModelMixin,
 
     serializer_class = FollowSerializer
     permission_classes = (IsAuthenticated,)
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
         return (
-            Follow.objects.filter(
-                follower=self.request.user).prefetch_related('author__recipe'))
-
-
-class IngredientViewSet(viewsets.ModelViewSet):
+            Follow.objects.filter(follower=self.request.user)
+            .select_related('author')
+            .order_by(*self.cursor_ordering))
+
+    def paginate_queryset(self, queryset):
+        """Подгружает рецепты авторов только для текущей страницы."""
+        page = super().paginate_queryset(queryset)
+        follows = queryset if page is None else page
+        recipes = Recipe.objects.filter(
+            author__in=[follow.author_id for follow in follows])
+        limit = get_recipes_limit(self.request)
+        if limit is not None:
+            recipes = recipes.latest_per_author(limit)
+        prefetch_related_objects(
+            follows,
+            Prefetch('author__recipe',
+                     queryset=recipes.order_by('-pub_date'),
+                     to_attr='feed_recipes'))
+        return page
+
+
+class IngredientViewSet(AsyncReferenceMixin, ReferenceCacheMixin,
+                        viewsets.ModelViewSet):
     """Вьюсет просмотра Ингредиентов."""
 
     queryset = Ingredient.objects.all()
@@ -187,6 +378,37 @@ class IngredientViewSet(viewsets.ModelViewSet):
     permission_classes = (AllowAny,)
     pagination_class = None
     http_method_names = ['get']
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
-    filterset_fields = ('name',)
+    cache_namespace = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск Ингредиентов по началу названия.
+
+        Отвечает из индекса в памяти процесса готовыми JSON-фрагментами,
+        без запросов к БД. Параметр limit ограничивает число результатов.
+        Повторный запрос с If-None-Match получает 304.
+        """
+        try:
+            limit = int(request.query_params.get('limit'))
+        except (TypeError, ValueError):
+            limit = None
+        if limit is not None and limit < 0:
+            limit = None
+        name = request.query_params.get('name', '')
+
+        def render():
+            fragments = get_ingredient_index().search(name, limit)
+            return b'[' + b','.join(fragments) + b']'
+
+        return self.reference_response(request, render)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = parse_id(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+
+        def render():
+            index = get_ingredient_index()
+            if pk not in index.positions:
+                raise NotFound()
+            return index.fragments[index.positions[pk]]
+
+        return self.reference_response(request, render)
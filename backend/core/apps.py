@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Учет запросов подключается к соединениям при их открытии.
+        from . import metrics  # noqa: F401
@@ -0,0 +1,325 @@
+import base64
+import random
+from io import BytesIO
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.ranking import refresh_ranks
+from api.signals import COUNTERS
+from core.management.commands.recount import recount
+from core.metrics import get_budget
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, RecipeRank, RecipeTag,
+                            ShoppingCart, Tag)
+
+User = get_user_model()
+
+PREFIX = 'bench'
+# Почта синтетических пользователей: домен .invalid зарезервирован и не
+# встречается у настоящих, поэтому по нему данные можно удалить.
+SYNTHETIC_DOMAIN = 'bench.invalid'
+PASSWORD = 'bench-password'
+BATCH_SIZE = 5000
+# Пустые локальные кэши на время замера: считаются запросы без кэша.
+LOCAL_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'benchmark-{alias}'}
+    for alias in ('default', 'versions')}
+
+
+def bulk(model, rows):
+    """Записывает строки генератора пачками по BATCH_SIZE."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        model.objects.bulk_create(batch, batch_size=BATCH_SIZE,
+                                  ignore_conflicts=True)
+
+
+def synthetic_users():
+    return User.objects.filter(email__endswith=f'@{SYNTHETIC_DOMAIN}')
+
+
+def pairs(count, left, right):
+    """count случайных пар из двух списков id."""
+    for _ in range(count):
+        yield random.choice(left), random.choice(right)
+
+
+@transaction.atomic
+def seed(recipes):
+    """
+    Синтетические данные: recipes Рецептов, по 2 тега и 5 ингредиентов
+    на Рецепт, вдвое больше Избранного, столько же Списков покупок и
+    по 20 подписок на пользователя. Почта пользователей — в домене
+    SYNTHETIC_DOMAIN.
+    """
+    start = synthetic_users().count()
+    users = max(recipes // 20, 10)
+    bulk(User, (User(username=f'{PREFIX}{i}',
+                     email=f'{PREFIX}{i}@{SYNTHETIC_DOMAIN}',
+                     first_name=PREFIX, last_name=PREFIX, password='!')
+                for i in range(start, start + users)))
+    user_ids = list(synthetic_users().values_list('pk', flat=True))
+    bulk(Tag, (Tag(name=f'{PREFIX}-{i}', slug=f'{PREFIX}-{i}',
+                   color='#FFFFFF') for i in range(10)))
+    tag_ids = list(Tag.objects.values_list('pk', flat=True))
+    bulk(Ingredient, (Ingredient(name=f'{PREFIX}-{i}', measurement_unit='г')
+                      for i in range(500)))
+    ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+
+    last_id = Recipe.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+    bulk(Recipe, (Recipe(author_id=random.choice(user_ids),
+                         name=f'{PREFIX} {i}', text=PREFIX,
+                         cooking_time=random.randint(1, 180),
+                         image=f'{PREFIX}.png')
+                  for i in range(recipes)))
+    recipe_ids = list(Recipe.objects.filter(pk__gt=last_id).values_list(
+        'pk', flat=True))
+    bulk(RecipeRank, (RecipeRank(recipe_id=recipe_id)
+                      for recipe_id in recipe_ids))
+    bulk(RecipeTag, (RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                     for recipe_id in recipe_ids
+                     for tag_id in random.sample(tag_ids, 2)))
+    bulk(RecipeIngredient, (
+        RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                         amount=random.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in random.sample(ingredient_ids, 5)))
+    bulk(Favorite, (Favorite(user_id=user_id, recipe_id=recipe_id)
+                    for user_id, recipe_id in pairs(
+                        2 * recipes, user_ids, recipe_ids)))
+    bulk(ShoppingCart, (ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+                        for user_id, recipe_id in pairs(
+                            recipes, user_ids, recipe_ids)))
+    bulk(Follow, (Follow(follower_id=follower, author_id=author)
+                  for follower, author in pairs(
+                      20 * users, user_ids, user_ids)
+                  if follower != author))
+    # bulk_create не отправляет сигналов, которые ведут счетчики.
+    for counter in COUNTERS:
+        recount(*counter, batch_size=BATCH_SIZE)
+    refresh_ranks()
+
+
+def png_data_uri():
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4), '#E26C2D').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def get_client(user=None):
+    client = APIClient(SERVER_NAME='localhost')
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def call_api(method, path, data=None, user=None):
+    """Ответ на вызов API и число выполненных запросов к БД без кэша."""
+    client = get_client(user)
+    clear_caches()
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(path, data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return response, len(queries)
+
+
+class Scenario:
+    """
+    Вызовы API для замера числа запросов к БД.
+
+    Выбирается синтетический пользователь user с Избранным, Списком
+    покупок и наибольшим числом подписок: на пустых страницах
+    предвыборки не выполняются. Подписка на автора author снимается, а
+    Рецепт recipe не входит в Избранное и Список покупок user, чтобы
+    их можно было оформить через API.
+    """
+
+    def __init__(self):
+        self.user = synthetic_users().filter(
+            pk__in=Favorite.objects.values('user'),
+        ).filter(
+            pk__in=ShoppingCart.objects.values('user'),
+        ).annotate(
+            follows=Count('follower')).order_by('-follows', 'pk').first()
+        self.user.set_password(PASSWORD)
+        self.user.save(update_fields=['password'])
+        follow = self.user.follower.filter(
+            author__recipe__isnull=False).select_related('author').first()
+        self.author = follow.author
+        follow.delete()
+        self.recipe = Recipe.objects.exclude(
+            pk__in=Favorite.objects.filter(user=self.user).values('recipe')
+        ).exclude(
+            pk__in=ShoppingCart.objects.filter(
+                user=self.user).values('recipe')
+        ).first()
+        self.tags = list(Tag.objects.filter(
+            pk__in=RecipeTag.objects.values('tag')).values_list(
+            'pk', 'slug')[:3])
+        self.ingredients = list(
+            Ingredient.objects.values_list('pk', flat=True)[:4])
+
+    def grow(self, recipes):
+        """Добавляет recipes Рецептов, сохраняя сценарий выполнимым."""
+        seed(recipes)
+        # Новые случайные связи не должны занять те, что создаются
+        # через API.
+        Follow.objects.filter(follower=self.user, author=self.author).delete()
+        Favorite.objects.filter(user=self.user, recipe=self.recipe).delete()
+        ShoppingCart.objects.filter(
+            user=self.user, recipe=self.recipe).delete()
+
+    def read_calls(self, user):
+        """Чтение, одинаково доступное анонимно и пользователю."""
+        recipe, author = self.recipe.pk, self.author.pk
+        tags = '&'.join(f'tags={slug}' for _, slug in self.tags[:2])
+        return [
+            ('GET recipes', 'get', '/api/recipes/', None, user),
+            ('GET recipes page 2', 'get', '/api/recipes/?page=2', None, user),
+            ('GET recipes cursor', 'get', '/api/recipes/?cursor=', None, user),
+            ('GET recipes tags', 'get', f'/api/recipes/?{tags}', None, user),
+            ('GET recipes author', 'get', f'/api/recipes/?author={author}',
+             None, user),
+            ('GET recipes popular', 'get', '/api/recipes/?ordering=popular',
+             None, user),
+            ('GET recipe', 'get', f'/api/recipes/{recipe}/', None, user),
+            ('GET tags', 'get', '/api/tags/', None, user),
+            ('GET tag', 'get', f'/api/tags/{self.tags[0][0]}/', None, user),
+            ('GET ingredients', 'get', f'/api/ingredients/?name={PREFIX}-1',
+             None, user),
+            ('GET ingredient', 'get',
+             f'/api/ingredients/{self.ingredients[0]}/', None, user),
+            ('GET users', 'get', '/api/users/', None, user),
+            ('GET user', 'get', f'/api/users/{author}/', None, user),
+        ]
+
+    def user_calls(self):
+        """Чтение, доступное только пользователю."""
+        user = self.user
+        return [
+            ('GET recipes favorited', 'get', '/api/recipes/?is_favorited=1',
+             None, user),
+            ('GET recipes in cart', 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None, user),
+            ('GET me', 'get', '/api/users/me/', None, user),
+            ('GET subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None, user),
+            ('GET download txt', 'get',
+             '/api/recipes/download_shopping_cart/?format=txt', None, user),
+            ('GET download pdf', 'get',
+             '/api/recipes/download_shopping_cart/?format=pdf', None, user),
+        ]
+
+    def write_calls(self, label):
+        """Запись; вызовы идут по порядку и возвращают данные как были."""
+        user = self.user
+        calls = []
+        for action in ('favorite', 'shopping_cart'):
+            path = f'/api/recipes/{self.recipe.pk}/{action}/'
+            calls.append((f'POST {action}', 'post', path, None, user))
+            calls.append((f'DELETE {action}', 'delete', path, None, user))
+        path = f'/api/users/{self.author.pk}/subscribe/'
+        calls.append(('POST subscribe', 'post', path, None, user))
+        calls.append(('DELETE subscribe', 'delete', path, None, user))
+        tags = [pk for pk, _ in self.tags]
+        ingredients = self.ingredients
+        payload = {
+            'tags': tags[:2],
+            'ingredients': [{'id': pk, 'amount': 10}
+                            for pk in ingredients[:3]],
+            'name': f'{PREFIX} {label}',
+            'image': png_data_uri(),
+            'text': PREFIX,
+            'cooking_time': 10,
+        }
+        return calls + [
+            ('POST recipe', 'post', '/api/recipes/', payload, user),
+            # Правка снимает и добавляет тег, удаляет, меняет и добавляет
+            # ингредиент.
+            ('PATCH recipe', 'patch', '/api/recipes/{created}/',
+             dict(payload, name=f'{PREFIX} {label} 2', tags=tags[1:3],
+                  ingredients=[{'id': ingredients[0], 'amount': 20},
+                               {'id': ingredients[1], 'amount': 10},
+                               {'id': ingredients[3], 'amount': 10}]),
+             user),
+            ('DELETE recipe', 'delete', '/api/recipes/{created}/',
+             None, user),
+            ('POST user', 'post', '/api/users/', {
+                'email': f'{PREFIX}-{label}@{SYNTHETIC_DOMAIN}',
+                'username': f'{PREFIX}-{label}', 'first_name': PREFIX,
+                'last_name': PREFIX, 'password': PASSWORD}, None),
+            ('POST token login', 'post', '/api/auth/token/login/',
+             {'email': user.email, 'password': PASSWORD}, None),
+            ('POST token logout', 'post', '/api/auth/token/logout/',
+             None, user),
+        ]
+
+    def calls(self, label):
+        """Все вызовы сценария."""
+        return (self.read_calls(None) + self.read_calls(self.user)
+                + self.user_calls() + self.write_calls(label))
+
+
+def measure(calls):
+    """
+    Маршрут, метод, статус и число запросов каждого вызова по ключу
+    (название, 'anon' или 'user').
+    """
+    results = {}
+    created = None
+    for name, method, path, data, user in calls:
+        path = path.format(created=created)
+        response, count = call_api(method, path, data, user)
+        if name == 'POST recipe' and response.status_code == 201:
+            created = response.json()['id']
+        route = resolve(path.split('?')[0]).view_name
+        who = 'anon' if user is None else 'user'
+        results[name, who] = (route, method.upper(), response.status_code,
+                              count)
+    return results
+
+
+def compare(small, large):
+    """
+    Сравнивает замеры при small и large Рецептов.
+
+    Для каждого вызова возвращает ключ, маршрут, метод, число запросов
+    до и после и список проблем: ошибка в ответе, рост числа запросов с
+    данными (N+1 в сериализаторе или вьюсете) или превышение бюджета
+    QUERY_BUDGETS.
+    """
+    results = []
+    for key, (route, method, status, before) in small.items():
+        after_status, after = large[key][2:]
+        budget = get_budget(route, method)
+        problems = []
+        if max(status, after_status) >= 400:
+            problems.append(f'статус {max(status, after_status)}')
+        if after != before:
+            problems.append('растет с данными')
+        if budget is not None and max(before, after) > budget:
+            problems.append(f'бюджет {budget}')
+        results.append((key, route, method, before, after, problems))
+    return results
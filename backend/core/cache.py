@@ -0,0 +1,158 @@
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.response import Response
+
+
+def _version_key(namespace):
+    return f'version:{namespace}'
+
+
+def get_version(namespace):
+    """
+    Текущая версия пространства имен кэша.
+
+    Версия входит в ключи закэшированных данных, поэтому для инвалидации
+    достаточно увеличить одно число, не перебирая сами ключи. Версии
+    хранятся в кэше versions, общем для всех процессов сервера.
+    """
+    versions = caches['versions']
+    key = _version_key(namespace)
+    version = versions.get(key)
+    if version is None:
+        versions.add(key, int(time.time() * 1000), None)
+        version = versions.get(key)
+    return version
+
+
+def bump_version(*namespaces):
+    """
+    Увеличивает версии пространств имен кэша.
+
+    Версия — это время изменения в миллисекундах, поэтому после вытеснения
+    ключа из кэша она не совпадет ни с одной из прежних.
+    """
+    versions = caches['versions']
+    now = int(time.time() * 1000)
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        version = versions.get(key) or 0
+        versions.set(key, max(version + 1, now), None)
+
+
+def invalidate_on_commit(*namespaces):
+    """Инвалидирует кэш после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: bump_version(*namespaces))
+
+
+def normalize_query(request):
+    """Строка запроса с отсортированными параметрами и значениями."""
+    params = request.query_params
+    return urlencode([(key, value) for key in sorted(params)
+                      for value in sorted(params.getlist(key))])
+
+
+class VersionedValue:
+    """
+    Значение в памяти процесса, привязанное к версии пространства имен.
+
+    build() вызывается при первом обращении и после каждого увеличения
+    версии; между ними get() не обращается к БД.
+    """
+
+    def __init__(self, namespace, build):
+        self.namespace = namespace
+        self.build = build
+        self.current = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = get_version(self.namespace)
+        current = self.current
+        if current is None or current[0] != version:
+            with self.lock:
+                current = self.current
+                if current is None or current[0] != version:
+                    current = self.current = (version, self.build())
+        return current[1]
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширование ответов list/retrieve для анонимных пользователей.
+
+    Ответ анонимному пользователю не зависит от пользователя, поэтому
+    ключом служат версия cache_namespace, действие, адрес объекта
+    и нормализованная строка запроса.
+    """
+
+    cache_namespace = None
+
+    def get_cache_key(self, request):
+        query = normalize_query(request)
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        raw = f'{request.get_host()}|{self.action}|{lookup}|{query}'
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        version = get_version(self.cache_namespace)
+        return f'response:{self.cache_namespace}:{version}:{digest}'
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve,
+                                    *args, **kwargs)
+
+
+class ReferenceCacheMixin:
+    """
+    Ответы справочников готовыми JSON-байтами с ETag и Cache-Control.
+
+    Ответ одинаков для всех пользователей, поэтому токен не проверяется
+    заранее. ETag строится из версии cache_namespace и адреса запроса,
+    так что запрос с совпадающим If-None-Match получает 304 без
+    обращений к БД.
+    """
+
+    cache_namespace = None
+
+    def perform_authentication(self, request):
+        pass
+
+    def get_etag(self, request):
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        raw = f'{self.action}|{lookup}|{normalize_query(request)}'
+        digest = hashlib.md5(raw.encode()).hexdigest()[:16]
+        version = get_version(self.cache_namespace)
+        return f'"{self.cache_namespace}-{version}-{digest}"'
+
+    def reference_response(self, request, render):
+        """Ответ 304 по ETag или JSON-байты, которые вернет render()."""
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(render(),
+                                    content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, public=True,
+                            max_age=settings.REFERENCE_CACHE_MAX_AGE)
+        return response
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+_lock = threading.Lock()
+# Метка текущего асинхронного запроса; переходит в поток вместе с контекстом.
+_request = ContextVar('request', default=None)
+
+
+def get_db_executor():
+    """
+    Пул потоков для синхронного кода асинхронных вьюсетов.
+
+    Размер пула (ASYNC_DB_THREADS) ограничивает число одновременных
+    запросов к БД процесса; пул соединений DB_POOL_MAX_SIZE должен быть
+    не меньше.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_DB_THREADS,
+                    thread_name_prefix='foodgram-db')
+    return _executor
+
+
+def _call(func, args, kwargs):
+    # Поток пула не видит сигналов начала и конца запроса. Первый вызов
+    # запроса в потоке повторяет request_started: проверка соединения
+    # сбрасывается, как и в синхронном режиме, один раз на запрос.
+    request = _request.get()
+    for connection in connections.all():
+        if request is None or getattr(
+                connection, 'request', None) is not request:
+            connection.close_if_unusable_or_obsolete()
+            connection.request = request
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # После каждого вызова соединение закрывается (или возвращается в
+        # пул) по правилам request_finished, но уже проверенное соединение
+        # до конца запроса повторно не проверяется.
+        for connection in connections.all():
+            checked = getattr(connection, 'health_check_done', False)
+            connection.close_if_unusable_or_obsolete()
+            connection.health_check_done = checked
+
+
+async def run_sync(func, *args, **kwargs):
+    """Выполняет синхронную функцию в пуле потоков get_db_executor()."""
+    return await sync_to_async(
+        _call, thread_sensitive=False, executor=get_db_executor())(
+        func, args, kwargs)
+
+
+async def gather(*funcs):
+    """Выполняет независимые синхронные функции одновременно."""
+    return await asyncio.gather(*(run_sync(func) for func in funcs))
+
+
+class AsyncViewMixin:
+    """
+    Асинхронные обработчики вьюсета на точке входа ASGI.
+
+    Если у вьюсета есть метод async_<действие> (у APIView —
+    async_<метод HTTP>), при ASYNC_VIEWS запрос обрабатывает он:
+    аутентификация и проверка прав идут в пуле потоков, а обработчик
+    может выполнять независимые запросы к БД одновременно через gather.
+    Остальные действия и режим WSGI используют синхронные обработчики.
+
+    Синхронный DRF-вьюсет под ASGI в Django 3.2 выполняется в одном
+    потоке на процесс, поэтому горячие запросы чтения вынесены сюда.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        if actions is None:
+            view = super().as_view(**initkwargs)
+        else:
+            view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_VIEWS:
+            return view
+        sync_view = sync_to_async(view)
+        if actions is not None and 'get' in actions:
+            actions = {'head': actions['get'], **actions}
+
+        async def async_view(request, *args, **kwargs):
+            method = request.method.lower()
+            name = actions.get(method) if actions is not None else method
+            handler_name = f'async_{name}'
+            if not hasattr(cls, handler_name):
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            if actions is not None:
+                self.action_map = actions
+            token = _request.set(object())
+            try:
+                return await self.dispatch_async(
+                    getattr(self, handler_name), request, *args, **kwargs)
+            finally:
+                _request.reset(token)
+
+        # Атрибуты cls, actions и csrf_exempt переносятся с view; декоратор
+        # csrf_exempt в Django 3.2 сделал бы функцию синхронной.
+        update_wrapper(async_view, view)
+        return async_view
+
+    async def dispatch_async(self, handler, request, *args, **kwargs):
+        """Повторяет APIView.dispatch для асинхронного обработчика."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await run_sync(self.initial, request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs)
+        return self.response
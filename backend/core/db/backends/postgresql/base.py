@@ -0,0 +1,66 @@
+from django.db.backends.postgresql.base import \
+    DatabaseWrapper as PostgresDatabaseWrapper
+
+from core.db.pool import get_pool
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """
+    Бэкенд PostgreSQL с проверкой соединений и необязательным пулом.
+
+    CONN_HEALTH_CHECKS: постоянное соединение (CONN_MAX_AGE > 0) при
+    первом использовании в запросе проверяется запросом SELECT 1 и
+    при обрыве открывается заново, как в Django 4.1.
+
+    POOL: {'MAX_SIZE', 'TIMEOUT', 'MAX_IDLE'} — соединения берутся из
+    пула процесса и при закрытии возвращаются в него. Подходит для
+    воркеров с потоками и асинхронных воркеров при CONN_MAX_AGE = 0.
+    При CONN_HEALTH_CHECKS свободное соединение пул проверяет сам перед
+    выдачей, поэтому полученное из пула считается проверенным.
+    """
+
+    health_check_done = False
+
+    @property
+    def pool(self):
+        if not self.settings_dict.get('POOL'):
+            return None
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params))
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Закрытое внутри atomic соединение остается у обертки до выхода
+        # из блока, поэтому другим потокам оно не отдается.
+        pool.release(self.connection, reuse=not self.in_atomic_block)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if (self.settings_dict.get('CONN_HEALTH_CHECKS')
+                    and not self.is_usable()):
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Вызывается в начале и в конце запроса: следующий запрос снова
+        # проверит соединение перед использованием.
+        self.health_check_done = False
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+from psycopg2 import extensions
+
+
+class PoolTimeout(OperationalError):
+    """Свободное соединение не появилось за отведенное время."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений psycopg2 процесса.
+
+    Одновременно выдается не больше max_size соединений; если все заняты,
+    acquire ждет до timeout секунд. Соединения, простоявшие без дела
+    дольше max_idle секунд, закрываются вместо повторного использования.
+    При check свободное соединение перед выдачей проверяется запросом
+    SELECT 1, и оборванное сервером закрывается.
+    """
+
+    def __init__(self, max_size, timeout, max_idle, check=True):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check = check
+        self.idle = deque()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ('created', 'reused', 'discarded', 'waits', 'timeouts', 'in_use'),
+            0)
+
+    def count(self, name, delta=1):
+        with self.lock:
+            self.counters[name] += delta
+
+    def acquire(self, connect):
+        """Соединение из пула; новое создается функцией connect()."""
+        if not self.slots.acquire(blocking=False):
+            self.count('waits')
+            if not self.slots.acquire(timeout=self.timeout):
+                self.count('timeouts')
+                raise PoolTimeout(
+                    f'Нет свободного соединения за {self.timeout} с '
+                    f'(размер пула {self.max_size})')
+        try:
+            connection = self.take_idle()
+            if connection is None:
+                connection = connect()
+                self.count('created')
+            else:
+                self.count('reused')
+        except BaseException:
+            self.slots.release()
+            raise
+        self.count('in_use')
+        return connection
+
+    def take_idle(self):
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection, released = self.idle.pop()
+            if (not connection.closed and now - released < self.max_idle
+                    and (not self.check or self.is_usable(connection))):
+                return connection
+            self.discard(connection)
+
+    def is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if (connection.get_transaction_status()
+                    != extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    def release(self, connection, reuse=True):
+        """
+        Возвращает соединение в пул, откатив незавершенную транзакцию.
+
+        При reuse=False соединение закрывается, а место в пуле освобождается.
+        """
+        self.count('in_use', -1)
+        try:
+            if reuse and self.reset(connection):
+                with self.lock:
+                    self.idle.append((connection, time.monotonic()))
+            else:
+                self.discard(connection)
+        finally:
+            self.slots.release()
+
+    def reset(self, connection):
+        """Откатывает транзакцию; True, если соединение можно отдать снова."""
+        try:
+            status = connection.get_transaction_status()
+            if status in (extensions.TRANSACTION_STATUS_INTRANS,
+                          extensions.TRANSACTION_STATUS_INERROR):
+                connection.rollback()
+                status = connection.get_transaction_status()
+        except Exception:
+            return False
+        return not connection.closed and (
+            status == extensions.TRANSACTION_STATUS_IDLE)
+
+    def discard(self, connection):
+        self.count('discarded')
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, idle=len(self.idle),
+                        max_size=self.max_size)
+
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """
+    Пул соединений псевдонима БД в текущем процессе.
+
+    После fork (воркеры gunicorn с preload) пул создается заново:
+    соединения родителя дочернему процессу не передаются.
+    """
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = settings_dict['POOL']
+                pool = _pools[key] = ConnectionPool(
+                    max_size=options.get('MAX_SIZE', 10),
+                    timeout=options.get('TIMEOUT', 10),
+                    max_idle=options.get('MAX_IDLE', 300),
+                    check=settings_dict.get('CONN_HEALTH_CHECKS', True))
+    return pool
+
+
+def pool_stats():
+    """Статистика пулов текущего процесса по псевдонимам БД."""
+    pid = os.getpid()
+    return {alias: pool.stats()
+            for (alias, owner), pool in list(_pools.items()) if owner == pid}
@@ -0,0 +1,94 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+
+# Режимы работы с соединениями: изменения настроек БД.
+MODES = {
+    'close': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'POOL': None},
+    'persistent': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True,
+                   'POOL': None},
+    'pool': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+             'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 10, 'MAX_IDLE': 300}},
+}
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    """
+    Задержка запросов при разных режимах соединений с БД.
+
+    Запросы идут через тестовый клиент Django с сигналами начала и конца
+    запроса, поэтому соединения открываются и закрываются так же, как
+    в воркере. Справочники Тегов и Ингредиентов отвечают из памяти, так
+    что по умолчанию измеряется /api/health/ с запросом SELECT 1.
+    """
+
+    help = ('Compare request latency without, with persistent and pooled '
+            'database connections')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--mode', action='append', dest='modes',
+                            choices=MODES)
+
+    def run(self, urls, requests, threads):
+        local = threading.local()
+        barrier = threading.Barrier(threads)
+
+        def close(_):
+            barrier.wait()
+            connections.close_all()
+
+        def request(number):
+            if not hasattr(local, 'client'):
+                local.client = Client(SERVER_NAME='localhost')
+            started = time.perf_counter()
+            response = local.client.get(urls[number % len(urls)])
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f'{urls[number % len(urls)]}: {response.status_code}')
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # Прогрев: первый запрос загружает URL-конфигурацию и кэши.
+            list(executor.map(request, range(threads)))
+            started = time.perf_counter()
+            timings = sorted(executor.map(request, range(requests)))
+            elapsed = time.perf_counter() - started
+            # Соединения принадлежат потокам: каждый поток закрывает свои,
+            # чтобы следующий режим начинал без них.
+            list(executor.map(close, range(threads)))
+        return timings, elapsed
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or ['/api/health/']
+        settings_dict = connections.databases['default']
+        original = {key: settings_dict.get(key) for key in MODES['pool']}
+        try:
+            for mode in options['modes'] or MODES:
+                connections.close_all()
+                settings_dict.update(MODES[mode])
+                if mode == 'pool' and settings_dict['ENGINE'] != (
+                        'core.db.backends.postgresql'):
+                    self.stdout.write(self.style.WARNING(
+                        f'{mode}: нужен ENGINE core.db.backends.postgresql'))
+                    continue
+                timings, elapsed = self.run(
+                    urls, options['requests'], options['threads'])
+                self.stdout.write(
+                    f'{mode:>10}: {len(timings) / elapsed:7.0f} запр/с, '
+                    f'p50 {statistics.median(timings) * 1000:6.2f} мс, '
+                    f'p99 {percentile(timings, 0.99) * 1000:6.2f} мс')
+        finally:
+            connections.close_all()
+            settings_dict.update(original)
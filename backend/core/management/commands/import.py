@@ -1,31 +1,98 @@
+import csv
 import json
-import os
-from io import open
+import re
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from core.cache import bump_version
 from recipes.models import Ingredient as Ingrt
 
+READ_CHUNK_SIZE = 64 * 1024
+SEPARATOR = re.compile(r'[\s,]*')
 
-def ingredient_import_json():
-    """Импорт объектов ингредиентов из json-файла."""
-    os.chdir('..')
-    os.chdir('data')
-    full_path = os.getcwd()
-    with open(full_path + r'/ingredients.json',
-              encoding='utf-8') as f:
-        data = json.load(f)
-        for object in data:
 
-            try:
-                name = object["name"]
-                mu = object["measurement_unit"]
-                ingredient = Ingrt.objects.get_or_create(name=name,
-                                                         measurement_unit=mu)
-                print(f'Объект импортирован: {ingredient},')
+def iter_csv(file):
+    """Строки CSV-файла вида «название,единица измерения»."""
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
 
-            except SystemError:
-                print('Ошибка импортирования')
+
+def iter_json(file):
+    """
+    Объекты JSON-массива, прочитанные из файла по частям.
+
+    Файл не загружается в память целиком: очередной объект разбирается
+    из буфера, как только он прочитан полностью.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив объектов')
+    position = 1
+    while True:
+        position = SEPARATOR.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            obj, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Неожиданный конец JSON-файла')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if isinstance(obj, dict) and 'name' in obj:
+            yield obj['name'], obj.get('measurement_unit', '')
+
+
+READERS = {
+    '.csv': iter_csv,
+    '.json': iter_json,
+}
+
+
+def ingredient_import(path, batch_size):
+    """
+    Импорт ингредиентов из csv- или json-файла.
+
+    Строки читаются потоком и пачками по batch_size записываются через
+    bulk_create. Уже существующие пары (название, единица измерения)
+    отбрасываются в памяти, а ограничение unique_ingredient делает
+    повторный импорт идемпотентным.
+    """
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        raise CommandError(f'Неизвестный формат файла: {path.suffix}')
+    seen = set(Ingrt.objects.values_list('name', 'measurement_unit'))
+    read = 0
+    with open(path, encoding='utf-8') as file, transaction.atomic():
+        # Созданные строки считаются по таблице: bulk_create с
+        # ignore_conflicts не сообщает, какие строки БД пропустила.
+        before = Ingrt.objects.count()
+        rows = reader(file)
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            read += len(chunk)
+            batch = []
+            for name, unit in chunk:
+                key = (name.strip(), unit.strip())
+                if key[0] and key not in seen:
+                    seen.add(key)
+                    batch.append(Ingrt(name=key[0], measurement_unit=key[1]))
+            Ingrt.objects.bulk_create(batch, batch_size=batch_size,
+                                      ignore_conflicts=True)
+        created = Ingrt.objects.count() - before
+        transaction.on_commit(lambda: bump_version('ingredients', 'recipes'))
+    return read, created
 
 
 class Command(BaseCommand):
@@ -33,5 +100,24 @@ class Command(BaseCommand):
 
     help = 'Command to import ingredients'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=settings.DATA_DIR / 'ingredients.csv',
+            type=Path,
+            help='csv- или json-файл с ингредиентами')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='размер пачки для bulk_create')
+
     def handle(self, *args, **options):
-        ingredient_import_json()
+        path = options['path']
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+        started = time.monotonic()
+        read, created = ingredient_import(path, options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {read}, импортировано: {created}, '
+            f'пропущено: {read - created} за {elapsed:.2f} с '
+            f'({read / elapsed if elapsed else read:.0f} строк/с)'))
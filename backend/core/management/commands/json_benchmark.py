@@ -0,0 +1,101 @@
+import io
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, orjson
+
+
+def recipe_page(page_size, ingredients, tags):
+    """Страница списка Рецептов в формате RecipeSerializer."""
+    url = 'https://foodgram.example.com/media'
+    return {
+        'count': 12345,
+        'next': 'https://foodgram.example.com/api/recipes/?page=3',
+        'previous': 'https://foodgram.example.com/api/recipes/?page=1',
+        'results': [{
+            'id': recipe,
+            'tags': [{'id': tag, 'name': f'Завтрак {tag}',
+                      'color': '#E26C2D', 'slug': f'breakfast-{tag}'}
+                     for tag in range(tags)],
+            'author': {'email': f'povar{recipe}@example.com',
+                       'id': recipe % 100, 'username': f'povar{recipe}',
+                       'first_name': 'Иван', 'last_name': 'Петров',
+                       'is_subscribed': recipe % 2 == 0},
+            'ingredients': [{'id': item, 'name': f'Картофель молодой {item}',
+                             'measurement_unit': 'г', 'amount': 150 + item}
+                            for item in range(ingredients)],
+            'is_favorited': recipe % 3 == 0,
+            'is_in_shopping_cart': False,
+            'name': f'Драники со сметаной №{recipe}',
+            'image': f'{url}/variants/{recipe}/image_320.webp',
+            'image_srcset': {
+                'webp': ', '.join(f'{url}/variants/{recipe}/image_{width}.webp'
+                                  f' {width}w' for width in (320, 640, 1280)),
+                'jpeg': ', '.join(f'{url}/variants/{recipe}/image_{width}.jpeg'
+                                  f' {width}w' for width in (320, 640, 1280)),
+            },
+            'text': 'Натереть картофель, отжать, смешать с яйцом и мукой. '
+                    'Жарить на раскаленной сковороде до золотистой корочки.'
+                    * 3,
+            'cooking_time': 40,
+            'pub_date': datetime(2023, 11, 11, 5, 36, recipe % 60, 123456,
+                                 tzinfo=timezone.utc),
+            'price': Decimal('199.90'),
+        } for recipe in range(page_size)],
+    }
+
+
+def throughput(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    """Сравнение скорости JSON-рендерера и парсера DRF и orjson."""
+
+    help = 'Benchmark JSON rendering and parsing of a recipe page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--page-size', type=int,
+                            default=settings.PAGE_SIZE)
+        parser.add_argument('--ingredients', type=int, default=10)
+        parser.add_argument('--tags', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен: FastJSONRenderer использует json'))
+        data = recipe_page(options['page_size'], options['ingredients'],
+                           options['tags'])
+        iterations = options['iterations']
+        standard, fast = JSONRenderer(), FastJSONRenderer()
+        body = standard.render(data)
+        same = fast.render(data) == body
+        self.stdout.write(
+            f'Страница: {len(body) / 1024:.1f} КиБ, вывод '
+            f'{"совпадает" if same else "НЕ совпадает"} побайтно')
+        rows = (
+            ('render', lambda: standard.render(data),
+             lambda: fast.render(data)),
+            ('parse',
+             lambda: JSONParser().parse(io.BytesIO(body)),
+             lambda: FastJSONParser().parse(io.BytesIO(body))),
+        )
+        for name, baseline, candidate in rows:
+            before = throughput(baseline, iterations)
+            after = throughput(candidate, iterations)
+            size = len(body) / 2 ** 20
+            self.stdout.write(
+                f'{name}: json {before:.0f}/с ({before * size:.1f} МиБ/с), '
+                f'fast {after:.0f}/с ({after * size:.1f} МиБ/с), '
+                f'x{after / before:.1f}')
@@ -0,0 +1,108 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+# Сценарий по умолчанию: основные запросы чтения главной страницы.
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?ordering=popular',
+    '/api/tags/',
+    '/api/ingredients/?name=к',
+)
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест запущенного сервера.
+
+    Для каждого уровня параллельности клиенты в потоках в течение
+    duration секунд по кругу запрашивают пути сценария. Команда печатает
+    пропускную способность, задержки и рост пропускной способности
+    относительно первого уровня, так что видно, где сервер перестает
+    масштабироваться при заданных GUNICORN_WORKERS и GUNICORN_THREADS.
+    """
+
+    help = 'Load test a running server with increasing concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8022')
+        parser.add_argument('--path', action='append', dest='paths')
+        parser.add_argument('--concurrency', default='1,2,4,8,16')
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--token',
+                            help='Токен пользователя для Authorization')
+
+    def run(self, urls, concurrency, duration, headers):
+        deadline = time.perf_counter() + duration
+        lock = threading.Lock()
+        timings, errors = [], []
+
+        def client(number):
+            session = requests.Session()
+            session.headers.update(headers)
+            done, failed = [], 0
+            position = number
+            while time.perf_counter() < deadline:
+                url = urls[position % len(urls)]
+                position += 1
+                started = time.perf_counter()
+                try:
+                    response = session.get(url, timeout=30)
+                    response.content
+                    ok = response.status_code < 400
+                except requests.RequestException:
+                    ok = False
+                if ok:
+                    done.append(time.perf_counter() - started)
+                else:
+                    failed += 1
+            with lock:
+                timings.extend(done)
+                errors.append(failed)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(client, range(concurrency)))
+        return sorted(timings), sum(errors), time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        urls = [base_url + path for path in options['paths'] or DEFAULT_PATHS]
+        try:
+            levels = [int(level)
+                      for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency: числа через запятую')
+        headers = {'Accept-Encoding': 'gzip'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        # Прогрев: первые запросы строят индексы и кэши процесса.
+        for url in urls:
+            try:
+                requests.get(url, headers=headers, timeout=60)
+            except requests.RequestException as error:
+                raise CommandError(f'Сервер недоступен: {error}')
+
+        baseline = None
+        for level in levels:
+            timings, errors, elapsed = self.run(
+                urls, level, options['duration'], headers)
+            if not timings:
+                self.stdout.write(f'{level:>4} клиентов: ошибок {errors}')
+                continue
+            rate = len(timings) / elapsed
+            baseline = baseline or rate
+            self.stdout.write(
+                f'{level:>4} клиентов: {rate:8.1f} запр/с '
+                f'(x{rate / baseline:4.1f}), '
+                f'p50 {statistics.median(timings) * 1000:7.1f} мс, '
+                f'p99 {percentile(timings, 0.99) * 1000:7.1f} мс, '
+                f'ошибок {errors}')
@@ -0,0 +1,66 @@
+import random
+from tempfile import TemporaryDirectory
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from core.benchmark import LOCAL_CACHES, Scenario, compare, measure, seed
+
+
+class Command(BaseCommand):
+    """
+    Проверка числа запросов к БД для маршрутов API.
+
+    Внутри откатываемой транзакции команда создает синтетические данные
+    (Рецепты с тегами и ингредиентами, Избранное, Списки покупок,
+    подписки) и вызывает маршруты api/urls.py анонимно и от имени
+    пользователя. Затем данных становится в несколько раз больше, и
+    вызовы повторяются. Маршрут не проходит проверку, если число
+    запросов выросло вместе с данными (N+1 в сериализаторах) или
+    превысило бюджет QUERY_BUDGETS. Кэши на время проверки заменяются
+    пустым локальным, поэтому считаются запросы без кэша. Сценарий
+    общий с тестами api.tests (core.benchmark).
+
+    Работает и на SQLite; при ошибках завершается с ненулевым кодом,
+    так что подходит для CI.
+    """
+
+    help = 'Check that API routes run a bounded number of database queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--small', type=int, default=30,
+                            help='Рецептов при первом замере')
+        parser.add_argument('--large', type=int, default=300,
+                            help='Рецептов при втором замере')
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['large'] <= options['small']:
+            raise CommandError('--large должен быть больше --small')
+        # Одинаковые данные при каждом запуске.
+        random.seed(options['random_seed'])
+        with TemporaryDirectory() as media, override_settings(
+                CACHES=LOCAL_CACHES, MEDIA_ROOT=media,
+                QUERY_BUDGET_STRICT=False):
+            with transaction.atomic():
+                seed(options['small'])
+                scenario = Scenario()
+                small = measure(scenario.calls('small'))
+                scenario.grow(options['large'] - options['small'])
+                large = measure(scenario.calls('large'))
+                transaction.set_rollback(True)
+        failures = 0
+        for (name, who), route, method, before, after, problems in compare(
+                small, large):
+            failures += bool(problems)
+            line = (f'{name:<24} {who:<5} {route:<24} '
+                    f'{before:>3} -> {after:>3}  ')
+            if problems:
+                self.stdout.write(self.style.ERROR(
+                    line + ', '.join(problems)))
+            else:
+                self.stdout.write(line + 'OK')
+        if failures:
+            raise CommandError(f'Маршрутов с ошибками: {failures}')
+        self.stdout.write(self.style.SUCCESS('Все маршруты в бюджете'))
@@ -0,0 +1,165 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.utils import DownloadViewSet
+from api.views import FollowListViewSet, RecipeViewSet
+from core.benchmark import PREFIX, seed, synthetic_users
+from recipes.models import (Follow, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, Tag)
+
+User = get_user_model()
+
+# Индексы под запросы API; для плана «до» они снимаются.
+QUERY_INDEXES = (
+    (Recipe, 'recipe_author_pub_date_idx'),
+    (RecipeTag, 'recipetag_recipe_tag_idx'),
+    (RecipeIngredient, 'recipeingredient_cover_idx'),
+    (Follow, 'follow_follower_id_idx'),
+)
+
+
+def get_view(viewset, user, params=None):
+    request = Request(APIRequestFactory().get('/', params or {}))
+    request.user = user
+    return viewset(request=request, format_kwarg=None, action='list',
+                   kwargs={})
+
+
+def api_queries(user):
+    """Основные запросы API от имени user: название и queryset."""
+    page = settings.PAGE_SIZE
+    tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+
+    def recipes(params=None):
+        view = get_view(RecipeViewSet, user, params)
+        return view.filter_queryset(view.get_queryset())[:page]
+
+    follows = get_view(FollowListViewSet, user).get_queryset()
+    authors = list(follows.values_list('author_id', flat=True)[:page])
+    return (
+        ('recipes', recipes()),
+        ('recipes?tags', recipes({'tags': tags})),
+        ('recipes?author', recipes({'author': authors[:1] or user.pk})),
+        ('recipes?is_favorited', recipes({'is_favorited': 1})),
+        ('recipes?is_in_shopping_cart', recipes({'is_in_shopping_cart': 1})),
+        ('recipes?ordering=popular', recipes({'ordering': 'popular'})),
+        ('download_shopping_cart',
+         get_view(DownloadViewSet, user).merge_shopping_cart()),
+        ('subscriptions', follows[:page]),
+        ('subscriptions recipes',
+         Recipe.objects.filter(author__in=authors).latest_per_author(3)),
+    )
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def measure(queries):
+    """Планы и время выполнения запросов в миллисекундах."""
+    results = {}
+    for name, queryset in queries:
+        started = time.perf_counter()
+        list(queryset)
+        elapsed = (time.perf_counter() - started) * 1000
+        results[name] = explain(queryset), elapsed
+    return results
+
+
+@contextmanager
+def indexes_dropped():
+    """
+    Снимает индексы QUERY_INDEXES на время блока.
+
+    В PostgreSQL DDL транзакционный: индексы удаляются в транзакции,
+    которая затем откатывается. В остальных СУБД индексы создаются заново.
+    """
+    indexes = [(model, index) for model, name in QUERY_INDEXES
+               for index in model._meta.indexes if index.name == name]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            with connection.schema_editor(atomic=False) as editor:
+                for model, index in indexes:
+                    editor.remove_index(model, index)
+            yield
+            transaction.set_rollback(True)
+        return
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.add_index(model, index)
+
+
+class Command(BaseCommand):
+    """Планы запросов API с индексами и без них."""
+
+    help = ('Seed synthetic data and print query plans of the API queries '
+            'with and without the query indexes')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0, metavar='RECIPES',
+            help='создать столько синтетических Рецептов перед замером')
+        parser.add_argument(
+            '--user', help='username, от имени которого строятся запросы')
+        parser.add_argument(
+            '--no-compare', action='store_true',
+            help='не снимать индексы, показать только текущие планы')
+        parser.add_argument(
+            '--clean', action='store_true',
+            help='удалить синтетических пользователей, их данные, '
+                 'Теги и Ингредиенты')
+
+    def handle(self, *args, **options):
+        if options['clean']:
+            # Рецепты и остальные данные удаляются вместе с авторами.
+            deleted, _ = synthetic_users().delete()
+            for model in (Tag, Ingredient):
+                deleted += model.objects.filter(
+                    name__startswith=f'{PREFIX}-').delete()[0]
+            self.stdout.write(f'Удалено объектов: {deleted}')
+            return
+        if options['seed']:
+            started = time.monotonic()
+            seed(options['seed'])
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            self.stdout.write(
+                f'Создано Рецептов: {options["seed"]} '
+                f'за {time.monotonic() - started:.1f} с')
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+        else:
+            users = synthetic_users()
+        user = users.order_by('pk').first()
+        if user is None:
+            raise CommandError('Нет пользователя: укажите --user или --seed')
+
+        after = measure(api_queries(user))
+        before = {}
+        if not options['no_compare']:
+            with indexes_dropped():
+                before = measure(api_queries(user))
+        for name, (plan, elapsed) in after.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {name} =='))
+            if name in before:
+                self.stdout.write(f'-- без индексов: {before[name][1]:.1f} мс')
+                self.stdout.write(before[name][0])
+            self.stdout.write(f'-- с индексами: {elapsed:.1f} мс')
+            self.stdout.write(plan)
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.ranking import refresh_ranks
+
+
+class Command(BaseCommand):
+    """
+    Пересчет рейтинга Рецептов.
+
+    С --interval команда не завершается, а повторяет пересчет каждые
+    interval секунд: так она работает отдельным процессом вместо cron.
+    """
+
+    help = 'Refresh popular and trending recipe ranks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='пересчитать рейтинг с нуля')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='число строк, читаемых и записываемых за раз')
+        parser.add_argument(
+            '--interval', type=int,
+            default=settings.RECIPE_RANK_REFRESH_INTERVAL,
+            help='повторять пересчет каждые N секунд; 0 — один раз')
+
+    def handle(self, *args, **options):
+        self.refresh(options['full'], options['chunk_size'])
+        while options['interval'] > 0:
+            time.sleep(options['interval'])
+            # Соединение живет между пересчетами по правилам CONN_MAX_AGE.
+            close_old_connections()
+            self.refresh(False, options['chunk_size'])
+
+    def refresh(self, full, chunk_size):
+        started = time.monotonic()
+        updated = refresh_ranks(full, chunk_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рейтингов: {updated} '
+            f'за {time.monotonic() - started:.2f} с'))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.signals import COUNTERS
+from core.cache import bump_version
+
+
+def actual_count(model, field):
+    """Число строк model, ссылающихся на объект внешнего запроса."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+        field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), 0)
+
+
+def recount(model, field, owner, counter, batch_size, dry_run=False):
+    """
+    Пересчитывает счетчик и исправляет расхождения.
+
+    Сравнение с фактическим числом строк делается одним запросом,
+    а обновляются только разошедшиеся объекты, пачками по batch_size.
+    """
+    drifted = list(owner.objects.annotate(
+        actual=actual_count(model, field)).exclude(
+        **{counter: F('actual')}).values_list('pk', flat=True))
+    if dry_run:
+        return len(drifted)
+    for start in range(0, len(drifted), batch_size):
+        with transaction.atomic():
+            owner.objects.filter(
+                pk__in=drifted[start:start + batch_size]).update(
+                **{counter: actual_count(model, field)})
+    return len(drifted)
+
+
+class Command(BaseCommand):
+    """Пересчет счетчиков Избранного, Списков покупок, рецептов и подписок."""
+
+    help = 'Recount denormalized counters and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='число объектов в одном UPDATE')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='только показать число расхождений')
+
+    def handle(self, *args, **options):
+        repaired = 0
+        for model, field, owner, counter in COUNTERS:
+            drifted = recount(model, field, owner, counter,
+                              options['batch_size'], options['dry_run'])
+            repaired += drifted
+            self.stdout.write(
+                f'{owner._meta.model_name}.{counter}: '
+                f'расхождений {drifted}')
+        if repaired and not options['dry_run']:
+            bump_version('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            'Проверка завершена' if options['dry_run']
+            else f'Исправлено счетчиков: {repaired}'))
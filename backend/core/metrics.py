@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core.db.pool import pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограммы длительности запросов, сек.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_current = ContextVar('request_metrics', default=None)
+_serializing = ContextVar('serializing', default=False)
+
+
+class QueryBudgetExceeded(Exception):
+    """Запрос к API выполнил больше запросов к БД, чем допускает бюджет."""
+
+
+class RequestMetrics:
+    """
+    Показатели одного запроса к API.
+
+    Запросы к БД учитываются и из потоков пула асинхронных вьюсетов:
+    sync_to_async переносит в поток контекст с текущими показателями.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.duration = 0.0
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def add_query(self, duration, serializing=False):
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+            if serializing:
+                # Запросы ленивых выборок при сериализации учтены в db.
+                self.serialize_time -= duration
+
+    def add_serialize(self, duration):
+        with self.lock:
+            self.serialize_time += duration
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing, длительности в мс."""
+        app = max(self.duration - self.db_time - self.serialize_time
+                  - self.render_time, 0)
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'app;dur={app * 1000:.1f}',
+            f'total;dur={self.duration * 1000:.1f}',
+        ))
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - started, _serializing.get())
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """Подключает учет запросов к каждому соединению с БД."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RouteStats:
+    """Накопленные показатели маршрута."""
+
+    def __init__(self):
+        self.requests = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.duration = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.size = 0
+        self.over_budget = 0
+
+    def observe(self, metrics, over_budget):
+        self.requests += 1
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if metrics.duration <= bound:
+                self.buckets[index] += 1
+        self.duration += metrics.duration
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.db_time += metrics.db_time
+        self.serialize_time += metrics.serialize_time
+        self.render_time += metrics.render_time
+        self.size += metrics.size
+        self.over_budget += over_budget
+
+
+class MetricsRegistry:
+    """Показатели запросов процесса по именам маршрутов."""
+
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def observe(self, route, metrics, over_budget=False):
+        with self.lock:
+            if route not in self.routes:
+                self.routes[route] = RouteStats()
+            self.routes[route].observe(metrics, over_budget)
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+    def render(self):
+        """Показатели в текстовом формате Prometheus."""
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = []
+
+            def metric(name, kind, help_text, values):
+                lines.append(f'# HELP foodgram_{name} {help_text}')
+                lines.append(f'# TYPE foodgram_{name} {kind}')
+                for suffix, labels, value in values:
+                    lines.append(
+                        f'foodgram_{name}{suffix}{format_labels(labels)} '
+                        f'{value}')
+
+            metric('http_requests_total', 'counter', 'Запросы к API.', [
+                ('', {'route': route}, stats.requests)
+                for route, stats in routes])
+            metric('http_request_duration_seconds', 'histogram',
+                   'Длительность запросов.', [
+                       value for route, stats in routes
+                       for value in histogram(route, stats)])
+            metric('db_queries_total', 'counter', 'Запросы к БД.', [
+                ('', {'route': route}, stats.queries)
+                for route, stats in routes])
+            metric('db_queries_max', 'gauge',
+                   'Наибольшее число запросов к БД за запрос к API.', [
+                       ('', {'route': route}, stats.max_queries)
+                       for route, stats in routes])
+            metric('db_duration_seconds_total', 'counter',
+                   'Время запросов к БД.', [
+                       ('', {'route': route}, round(stats.db_time, 6))
+                       for route, stats in routes])
+            metric('serialize_duration_seconds_total', 'counter',
+                   'Время сериализации без запросов к БД.', [
+                       ('', {'route': route}, round(stats.serialize_time, 6))
+                       for route, stats in routes])
+            metric('render_duration_seconds_total', 'counter',
+                   'Время рендеринга ответов.', [
+                       ('', {'route': route}, round(stats.render_time, 6))
+                       for route, stats in routes])
+            metric('http_response_bytes_total', 'counter',
+                   'Размер ответов.', [
+                       ('', {'route': route}, stats.size)
+                       for route, stats in routes])
+            metric('query_budget_exceeded_total', 'counter',
+                   'Запросы к API сверх бюджета запросов к БД.', [
+                       ('', {'route': route}, stats.over_budget)
+                       for route, stats in routes])
+        metric('db_pool_connections', 'gauge', 'Соединения пула БД.', [
+            ('', {'alias': alias, 'state': state}, stats[state])
+            for alias, stats in pool_stats().items()
+            for state in ('in_use', 'idle')])
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+         .replace('\n', '\\n'))
+        for name, value in labels.items())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def histogram(route, stats):
+    for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+        yield '_bucket', {'route': route, 'le': bound}, count
+    yield '_bucket', {'route': route, 'le': '+Inf'}, stats.requests
+    yield '_sum', {'route': route}, round(stats.duration, 6)
+    yield '_count', {'route': route}, stats.requests
+
+
+registry = MetricsRegistry()
+
+
+def get_route(request):
+    """Имя маршрута запроса для группировки показателей."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+def get_budget(route, method='GET'):
+    """
+    Бюджет запросов к БД маршрута.
+
+    Ключ «МЕТОД маршрут» в QUERY_BUDGETS задает бюджет записи, ключ
+    «маршрут» — чтения. Маршруты без ключа (админка, страницы djoser и
+    прочие не перечисленные) бюджета не имеют: None.
+    """
+    budgets = settings.QUERY_BUDGETS
+    key = f'{method} {route}'
+    if key in budgets:
+        return budgets[key]
+    return budgets.get(route)
+
+
+def check_budget(route, method, metrics):
+    """
+    Сравнивает число запросов к БД с бюджетом маршрута.
+
+    Превышение пишется в лог, а при QUERY_BUDGET_STRICT (в тестах)
+    вызывает QueryBudgetExceeded.
+    """
+    budget = get_budget(route, method)
+    if budget is None or metrics.queries <= budget:
+        return False
+    message = (f'{method} {route}: {metrics.queries} запросов к БД '
+               f'при бюджете {budget}')
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+    return True
+
+
+class SerializationTimingMixin:
+    """
+    Засекает сериализацию ответа для показателей запроса.
+
+    Учитывается только внешний to_representation: вложенные сериализаторы
+    входят во время родителя, а при many=True время элементов
+    складывается.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or _serializing.get():
+            return super().to_representation(instance)
+        token = _serializing.set(True)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            _serializing.reset(token)
+            metrics.add_serialize(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """
+    Число и время запросов к БД, время сериализации и рендеринга
+    и размер ответа.
+
+    Показатели копятся в registry по именам маршрутов и отдаются
+    вьюхой core.views.metrics; при SERVER_TIMING они добавляются к
+    ответу заголовком Server-Timing. Запросы потокового ответа,
+    выполняемые после выхода из middleware, не учитываются.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django 3.2 узнает, что middleware асинхронный.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = request.metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        """Засекает рендеринг ответа, который идет после этого хука."""
+        metrics = request.metrics
+        started = time.perf_counter()
+
+        def rendered(response):
+            metrics.render_time += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, metrics):
+        metrics.duration = time.perf_counter() - metrics.started
+        if not response.streaming:
+            metrics.size = len(response.content)
+        route = get_route(request)
+        try:
+            over_budget = check_budget(route, request.method, metrics)
+        except QueryBudgetExceeded:
+            registry.observe(route, metrics, True)
+            raise
+        registry.observe(route, metrics, over_budget)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
@@ -0,0 +1,22 @@
+class CounterFieldsMixin:
+    """
+    Модель со счетчиками, которые меняются только UPDATE с F().
+
+    Обычный save() существующей строки не записывает counter_fields:
+    значения в памяти могли устареть, и запись вернула бы счетчику
+    старое значение, потеряв конкурентные изменения. Счетчики меняют
+    сигналы api.signals и команда recount.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')
+                and not self._state.adding and self.pk is not None):
+            skipped = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+                and field.attname not in skipped]
+        super().save(*args, **kwargs)
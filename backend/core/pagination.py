@@ -1,9 +1,141 @@
+import base64
+import json
+from collections import OrderedDict
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
-    """Кастомный Пагинатор."""
+    """
+    Кастомный Пагинатор.
+
+    По умолчанию постраничный (?page=N). Если у вьюсета задан
+    cursor_ordering, доступен режим курсора (?cursor=): страница
+    выбирается условием по ключу сортировки вместо OFFSET, а подсчет
+    общего числа объектов отключается параметром ?count=false.
+    """
 
     page_size_query_param = 'limit'
     page_size = settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if not ordering or self.cursor_query_param not in request.query_params:
+            self.cursor_mode = False
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_mode = True
+        self.request = request
+        self.ordering = ordering
+        self.annotations = queryset.query.annotations
+        self.fields = [self.get_ordering_field(queryset, name.lstrip('-'))
+                       for name in ordering]
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) not in (
+                'false', 'False', '0'):
+            self.count = queryset.count()
+
+        order = self.reverse_ordering() if reverse else ordering
+        queryset = queryset.order_by(*order)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(order, position))
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page_results = results
+        return results
+
+    def get_ordering_field(self, queryset, name):
+        """Поле модели или аннотации, по которому идет сортировка."""
+        if name in queryset.query.annotations:
+            return name, queryset.query.annotations[name].output_field
+        return name, queryset.model._meta.get_field(name)
+
+    def reverse_ordering(self):
+        return [name[1:] if name.startswith('-') else '-' + name
+                for name in self.ordering]
+
+    def get_keyset_filter(self, ordering, position):
+        """Условие «строго после позиции» для составного ключа сортировки."""
+        condition = Q()
+        for index, name in reversed(list(enumerate(ordering))):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': position[index]})
+            if index < len(ordering) - 1:
+                step |= Q(**{field: position[index]}) & condition
+            condition = step
+        return condition
+
+    def encode_cursor(self, obj, reverse):
+        position = [str(getattr(obj, name))
+                    if name in self.annotations else field.value_to_string(obj)
+                    for name, field in self.fields]
+        data = json.dumps({'r': reverse, 'p': position},
+                          separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return False, None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position = [field.to_python(value)
+                        for (_, field), value in zip(self.fields, data['p'])]
+            if len(position) != len(self.fields):
+                raise ValueError
+            return bool(data['r']), position
+        except (TypeError, ValueError, KeyError, AttributeError,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_link(self, obj, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(obj, reverse))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self.get_cursor_link(self.page_results[-1], False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.get_cursor_link(self.page_results[0], True)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,38 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Даты и время уходят в JSONEncoder DRF, чтобы формат совпадал
+    # со стандартным рендерером; нестроковые ключи приводятся к строкам,
+    # как в json.dumps.
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson.
+
+    Для данных, которые отдает API, вывод побайтно совпадает с
+    JSONRenderer при настройках DRF по умолчанию: компактный JSON в UTF-8
+    без \\u-экранирования кириллицы. Типы, которых нет в JSON (даты,
+    Decimal, ленивые строки), кодирует тот же JSONEncoder DRF. С отступом
+    (indent, Browsable API), при других настройках UNICODE_JSON и
+    COMPACT_JSON или без установленного orjson работает стандартный json.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        ret = orjson.dumps(data, default=self.encoder_class().default,
+                           option=ORJSON_OPTIONS)
+        # Как и JSONRenderer, экранируем U+2028 и U+2029 для JavaScript.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,45 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """Пул потоков процесса для фоновых задач, создается при первом вызове."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_WORKERS,
+                    thread_name_prefix='foodgram-task')
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Ошибка фоновой задачи %s', func.__name__)
+    finally:
+        # Соединения с БД принадлежат потоку пула; не держим их между
+        # задачами.
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Выполняет func в пуле потоков после фиксации текущей транзакции.
+
+    Внешний брокер не нужен: задачи живут в памяти процесса, поэтому
+    задача должна быть идемпотентной и переживать повторный запуск.
+    """
+    transaction.on_commit(
+        lambda: get_executor().submit(_run, func, args, kwargs))
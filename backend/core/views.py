@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import Http404, HttpResponse, JsonResponse
+
+from core.db.pool import pool_stats
+from core.metrics import registry
+
+
+def health(request):
+    """
+    Проверка готовности: доступна ли БД, и статистика пула соединений.
+
+    Отвечает 503, если запрос SELECT 1 не прошел, чтобы балансировщик
+    перестал направлять запросы в этот процесс.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        database = 'ok'
+    except DatabaseError:
+        database = 'unavailable'
+    return JsonResponse(
+        {'database': database, 'pool': pool_stats()},
+        status=200 if database == 'ok' else 503)
+
+
+def metrics(request):
+    """
+    Показатели запросов процесса в текстовом формате Prometheus.
+
+    Доступна при METRICS_ENABLED; наружу ее открывать не стоит.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')
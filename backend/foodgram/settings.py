@@ -34,6 +34,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'api.apps.ApiConfig',
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -88,17 +90,77 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 #     }
 # }
 
+# Пул соединений процесса (core.db.pool); при нем CONN_MAX_AGE не нужен.
+DB_POOL = os.getenv('DB_POOL') in ['TRUE', 'true', '1', 'yes']
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'core.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Сколько секунд держать соединение между запросами; 0 — закрывать
+        # после каждого запроса.
+        'CONN_MAX_AGE': 0 if DB_POOL else int(
+            os.getenv('DB_CONN_MAX_AGE', 60)),
+        # Проверять постоянное соединение перед первым запросом к БД.
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', 'true') in ['TRUE', 'true', '1', 'yes'],
+        'POOL': DB_POOL and {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE', 300)),
+        },
     }
 }
 
+# Кэш в файлах общий для всех процессов gunicorn одного узла; для
+# нескольких узлов нужен сетевой кэш.
+CACHE_DIR = Path(os.getenv('CACHE_DIR', '/tmp/foodgram_cache'))
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(CACHE_DIR / 'data')),
+    },
+    # Версии пространств имен кэша (core.cache). По ним процессы узнают об
+    # изменениях данных, поэтому хранилище должно быть общим, а версии не
+    # должны вытесняться данными.
+    'versions': {
+        'BACKEND': os.getenv(
+            'CACHE_VERSIONS_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_VERSIONS_LOCATION',
+                              str(CACHE_DIR / 'versions')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
+# Время жизни закэшированных ответов для анонимных пользователей, сек.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+# Сколько секунд клиенты и прокси могут не перепроверять справочники.
+REFERENCE_CACHE_MAX_AGE = int(os.getenv('REFERENCE_CACHE_MAX_AGE', 60))
+
+# Число результатов поиска Ингредиентов по подстроке, если limit не задан.
+INGREDIENT_SEARCH_LIMIT = 50
+
+# Форматы файла Списка покупок.
+SHOPPING_CART_RENDERERS = [
+    'api.utils.TextRenderer',
+    'api.utils.CSVRenderer',
+    'api.utils.JSONRenderer',
+    'api.utils.PDFRenderer',
+]
+SHOPPING_CART_CHUNK_SIZE = 2000
+# TTF-шрифт с кириллицей для PDF.
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -143,6 +205,80 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media'
 
+# Ограничения загружаемых картинок.
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+# JSON-запрос с картинкой в base64 на треть больше самой картинки.
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGE_MAX_BYTES * 4 // 3 + 1024 * 1024
+# Ширины уменьшенных копий картинок Рецептов, в пикселях.
+IMAGE_VARIANT_WIDTHS = [
+    int(width) for width in os.getenv(
+        'IMAGE_VARIANT_WIDTHS', '320,640,1280').split(',')]
+# Ширина копии, которая отдается в списках вместо исходной картинки.
+IMAGE_THUMBNAIL_WIDTH = int(os.getenv('IMAGE_THUMBNAIL_WIDTH', 320))
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+
+# Периоды полураспада оценок рейтинга Рецептов, в секундах.
+RECIPE_RANK_POPULAR_HALF_LIFE = int(os.getenv(
+    'RECIPE_RANK_POPULAR_HALF_LIFE', 30 * 24 * 60 * 60))
+RECIPE_RANK_TRENDING_HALF_LIFE = int(os.getenv(
+    'RECIPE_RANK_TRENDING_HALF_LIFE', 24 * 60 * 60))
+# Период пересчета рейтинга командой rank по умолчанию (rank --interval);
+# 0 — один пересчет за запуск.
+RECIPE_RANK_REFRESH_INTERVAL = int(os.getenv(
+    'RECIPE_RANK_REFRESH_INTERVAL', 0))
+
+# Число потоков для фоновых задач (core.tasks).
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+
+# Асинхронные обработчики чтения (core.concurrency); по умолчанию
+# включены при запуске через ASGI (gunicorn.conf.py).
+SERVER_INTERFACE = os.getenv('SERVER_INTERFACE', 'wsgi')
+ASYNC_VIEWS = os.getenv(
+    'ASYNC_VIEWS', 'true' if SERVER_INTERFACE == 'asgi' else 'false'
+) in ['TRUE', 'true', '1', 'yes']
+# Потоки для запросов к БД из асинхронных обработчиков.
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 8))
+
+# Показатели запросов (core.metrics): заголовок Server-Timing и
+# вьюха /api/metrics/ в формате Prometheus. Показатели копятся в каждом
+# процессе отдельно.
+SERVER_TIMING = os.getenv(
+    'SERVER_TIMING', 'true' if DEBUG else 'false'
+) in ['TRUE', 'true', '1', 'yes']
+METRICS_ENABLED = os.getenv('METRICS_ENABLED') in ['TRUE', 'true', '1', 'yes']
+# Наибольшее число запросов к БД по именам маршрутов (для записи — с
+# методом); не больше, чем нужно при любом объеме данных. Превышение
+# пишется в лог, а при QUERY_BUDGET_STRICT вызывает ошибку. Маршруты без
+# ключа (админка и прочие) не проверяются. Проверка — команда
+# query_budgets.
+QUERY_BUDGETS = {
+    'recipes-list': 8,
+    'recipes-detail': 6,
+    'tags-list': 2,
+    'tags-detail': 2,
+    'Ingredient-list': 2,
+    'Ingredient-detail': 2,
+    'customuser-list': 5,
+    'customuser-detail': 4,
+    'follow-list-list': 5,
+    'shopping_card': 4,
+    'api.views.UserMe': 2,
+    'favorite-detail-list': 10,
+    'shopping_cart-list': 10,
+    'follow-detail-list': 10,
+    'login': 4,
+    'logout': 3,
+    'POST recipes-list': 22,
+    'PATCH recipes-detail': 20,
+    'DELETE recipes-detail': 15,
+}
+QUERY_BUDGET_STRICT = os.getenv(
+    'QUERY_BUDGET_STRICT') in ['TRUE', 'true', '1', 'yes']
+
+# Каталог с файлами для импорта справочников.
+DATA_DIR = Path(os.getenv('DATA_DIR', BASE_DIR.parent / 'data'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -157,6 +293,15 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'core.pagination.CustomPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 PAGE_SIZE = 6
 
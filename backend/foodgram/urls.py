@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import health, metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/health/', health, name='health'),
+    path('api/metrics/', metrics, name='metrics'),
     path('api/', include('api.urls')),
 ]
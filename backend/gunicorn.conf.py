@@ -0,0 +1,88 @@
+"""
+Настройки gunicorn для Backend.
+
+gunicorn читает этот файл из рабочего каталога сам; каждый параметр
+можно переопределить переменной окружения GUNICORN_*.
+
+SERVER_INTERFACE выбирает точку входа:
+- wsgi (по умолчанию) — foodgram.wsgi с воркерами gthread: потоки
+  воркера не ждут друг друга на медленной загрузке картинки в base64;
+- asgi — foodgram.asgi с воркерами uvicorn.
+"""
+import multiprocessing
+import os
+
+
+def env(name, default):
+    return os.getenv(f'GUNICORN_{name}', default)
+
+
+def env_bool(name, default):
+    return env(name, str(default)) in ['TRUE', 'true', '1', 'yes', 'True']
+
+
+interface = os.getenv('SERVER_INTERFACE', 'wsgi')
+if interface == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    default_worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+    default_worker_class = 'gthread'
+
+bind = env('BIND', '0.0.0.0:8022')
+# Процессов вдвое больше ядер: пока один ждет БД, другой считает.
+workers = int(env('WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = env('WORKER_CLASS', default_worker_class)
+# Потоки воркера gthread; пул соединений с БД (DB_POOL_MAX_SIZE) должен
+# быть не меньше.
+threads = int(env('THREADS', 4))
+worker_connections = int(env('WORKER_CONNECTIONS', 1000))
+
+# Воркер перезапускается после max_requests ± jitter запросов, чтобы рост
+# памяти был ограничен, а воркеры не перезапускались одновременно.
+max_requests = int(env('MAX_REQUESTS', 1000))
+max_requests_jitter = int(env('MAX_REQUESTS_JITTER', 100))
+
+# Приложение загружается до fork: воркеры стартуют быстрее и делят
+# страницы памяти с кодом.
+preload_app = env_bool('PRELOAD', True)
+
+# Воркер, не отвечавший timeout секунд, перезапускается.
+timeout = int(env('TIMEOUT', 60))
+graceful_timeout = int(env('GRACEFUL_TIMEOUT', 30))
+keepalive = int(env('KEEPALIVE', 5))
+
+accesslog = env('ACCESS_LOG', None)
+errorlog = env('ERROR_LOG', '-')
+loglevel = env('LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """
+    Не дает запустить несколько воркеров с версиями кэша в памяти.
+
+    Версии кэша (core.cache) в LocMemCache у каждого воркера свои:
+    изменение, сделанное одним воркером, не увидели бы остальные.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from django.conf import settings
+
+    backend = settings.CACHES['versions']['BACKEND']
+    if server.cfg.workers > 1 and backend.endswith('.LocMemCache'):
+        raise RuntimeError(
+            'CACHE_VERSIONS_BACKEND=LocMemCache допустим только при '
+            'GUNICORN_WORKERS=1')
+
+
+def post_fork(server, worker):
+    """
+    Сбрасывает унаследованные от мастера соединения с БД.
+
+    Соединение, открытое при загрузке приложения, принадлежит мастеру:
+    воркер забывает о нем, не закрывая, иначе сервер БД закрыл бы его
+    и у мастера.
+    """
+    from django.db import connections
+
+    for connection in connections.all():
+        connection.connection = None
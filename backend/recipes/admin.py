@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 
 from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
-                     RecipeTag, ShoppingCart, Tag)
+                     RecipeRank, RecipeTag, ShoppingCart, Tag)
 
 User = get_user_model()
 
@@ -54,23 +54,19 @@ class RecipeAdmin(admin.ModelAdmin):
                     'cooking_time',
                     'get_tag',
                     'pub_date',
-                    'get_favorite_counter',
+                    'favorites_count',
+                    'in_carts_count',
                     )
 
     search_fields = ('name', 'author__username', 'tags__name')
     list_filter = ('author', 'tags', )
-    readonly_fields = ('get_favorite_counter',)
+    readonly_fields = ('favorites_count', 'in_carts_count')
 
     def get_tag(self, obj):
         """Позволяет увидеть все добавленные Теги."""
         return ", ".join([p.name for p in obj.tags.all()])
     get_tag.short_description = 'Теги'
 
-    def get_favorite_counter(self, obj):
-        """Позволяет увидеть кол-во добавлений в Избранное."""
-        return Favorite.objects.filter(recipe=obj).count()
-    get_favorite_counter.short_description = 'Всего в Избранном'
-
 
 class FavoriteAdmin(admin.ModelAdmin):
     """Кастомизация админки модели Избранное."""
@@ -96,6 +92,13 @@ class FollowAdmin(admin.ModelAdmin):
     )
 
 
+class RecipeRankAdmin(admin.ModelAdmin):
+    """Кастомизация админки модели Рейтингов."""
+
+    list_display = ('recipe', 'popular', 'trending')
+    list_select_related = ('recipe',)
+
+
 admin.site.register(Tag, TagAdmin)
 admin.site.register(RecipeTag)
 admin.site.register(Ingredient, IngredientAdmin)
@@ -104,3 +107,4 @@ admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingCart)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(RecipeRank, RecipeRankAdmin)
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.16 on 2026-10-18 08:46
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Объединяет Ингредиенты с одинаковыми названием и единицей измерения.
+
+    Остается Ингредиент с наименьшим id; строки Рецептов с дубликатами
+    переносятся на него, а если у Рецепта он уже есть — количества
+    складываются.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    groups = Ingredient.objects.order_by().values(
+        'name', 'measurement_unit').annotate(
+        keep=Min('pk'), total=Count('pk')).filter(total__gt=1)
+    for group in groups:
+        keep = group['keep']
+        duplicates = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit'],
+        ).exclude(pk=keep).values_list('pk', flat=True))
+        items = RecipeIngredient.objects.filter(
+            ingredient_id__in=duplicates).order_by('pk')
+        for item in items:
+            kept = RecipeIngredient.objects.filter(
+                recipe_id=item.recipe_id, ingredient_id=keep).first()
+            if kept is None:
+                item.ingredient_id = keep
+                item.save(update_fields=['ingredient'])
+            else:
+                kept.amount += item.amount
+                kept.save(update_fields=['amount'])
+                item.delete()
+        Ingredient.objects.filter(pk__in=duplicates).delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей выполняются сейчас: иначе
+        # ALTER TABLE в той же транзакции завершится ошибкой.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_ingredient_name_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
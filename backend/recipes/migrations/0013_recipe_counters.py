@@ -0,0 +1,48 @@
+# Generated by Django 3.2.16 on 2026-10-18 08:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Счетчик, модель строк и поле связи с владельцем счетчика.
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'Favorite', 'recipe'),
+    ('recipes', 'Recipe', 'in_carts_count', 'ShoppingCart', 'recipe'),
+    ('users', 'CustomUser', 'recipes_count', 'Recipe', 'author'),
+    ('users', 'CustomUser', 'followers_count', 'Follow', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app_label, model_name, counter, source, field in COUNTERS:
+        rows = apps.get_model('recipes', source).objects.filter(
+            **{field: OuterRef('pk')}).order_by().values(field).annotate(
+            total=Count('pk')).values('total')
+        apps.get_model(app_label, model_name).objects.update(
+            **{counter: Coalesce(Subquery(rows), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_image_variants'),
+        ('users', '0005_customuser_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Всего в Избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Всего в Списках покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
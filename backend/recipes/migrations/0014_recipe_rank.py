@@ -0,0 +1,76 @@
+# Generated by Django 3.2.16 on 2026-10-18 08:57
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_created(apps, schema_editor):
+    """
+    Время добавления существующих строк — дата публикации Рецепта.
+
+    Настоящее время добавления неизвестно; с текущим временем первый
+    пересчет рейтинга счел бы все прошлые события новыми.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    pub_date = Recipe.objects.filter(
+        pk=OuterRef('recipe_id')).values('pub_date')[:1]
+    for name in ('Favorite', 'ShoppingCart'):
+        apps.get_model('recipes', name).objects.update(
+            created=Subquery(pub_date))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankWatermark',
+            fields=[
+                ('source', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Источник')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Последний id')),
+                ('refreshed', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Отметка рейтинга',
+                'verbose_name_plural': 'Отметки рейтинга',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeRank',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('popular', models.FloatField(default=0, verbose_name='Популярность')),
+                ('trending', models.FloatField(default=0, verbose_name='Набирает популярность')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг Рецепта',
+                'verbose_name_plural': 'Рейтинги Рецептов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reciperank',
+            index=models.Index(fields=['-popular'], name='recipe_rank_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reciperank',
+            index=models.Index(fields=['-trending'], name='recipe_rank_trending_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.16 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+def create_ranks(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeRank = apps.get_model('recipes', 'RecipeRank')
+    RecipeRank.objects.bulk_create(
+        (RecipeRank(recipe_id=pk) for pk in Recipe.objects.filter(
+            rank__isnull=True).values_list('pk', flat=True).iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_rank'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_ranks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', 'id'], name='follow_follower_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['recipe', 'ingredient'], include=('amount',), name='recipeingredient_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetag',
+            index=models.Index(fields=['recipe', 'tag'], name='recipetag_recipe_tag_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_api_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-in_carts_count', '-pub_date'], name='recipe_in_carts_count_idx'),
+        ),
+    ]
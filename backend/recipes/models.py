@@ -1,6 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
+from core.models import CounterFieldsMixin
 from .validators import amount_validator, time_validator
 
 User = get_user_model()
@@ -32,13 +36,77 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [models.UniqueConstraint(
+            fields=['name', 'measurement_unit'],
+            name='unique_ingredient'
+        )]
 
     def __str__(self) -> str:
         """Отобращает название в виде имени."""
         return self.name
 
 
-class Recipe(models.Model):
+def read_prefetches():
+    """
+    Предвыборки Тегов и Ингредиентов для отображения Рецептов.
+
+    Запросы не зависят друг от друга, поэтому асинхронные вьюсеты
+    выполняют их одновременно.
+    """
+    return (
+        Prefetch('tags', queryset=Tag.objects.order_by('pk')),
+        Prefetch('recipeingredient',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient').order_by('pk')))
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Запросы к Рецептам."""
+
+    def with_user_flags(self, user):
+        """Аннотирует нахождение в Избранном и Списке покупок пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(False,
+                                          output_field=models.BooleanField()))
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
+
+    def for_read(self, user):
+        """
+        План чтения Рецептов для отображения.
+
+        Автор, теги и ингредиенты загружаются фиксированным числом
+        запросов независимо от размера выборки. Признак подписки на автора
+        вычисляет UserSerializer по общему для запроса набору подписок.
+        """
+        return self.with_user_flags(user).select_related(
+            'author').prefetch_related(*read_prefetches())
+
+    def latest_per_author(self, limit):
+        """
+        Не более limit последних рецептов каждого автора.
+
+        Нумерация внутри автора считается оконной функцией
+        ROW_NUMBER() OVER (PARTITION BY author ORDER BY pub_date DESC),
+        поэтому выборка для любого числа авторов делается одним запросом.
+        """
+        ranked = self.annotate(position=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=F('pub_date').desc(),
+        )).values('pk', 'position')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT "id" FROM ({sql}) AS "ranked" WHERE "position" <= %s',
+            (*params, limit)))
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Класс Рецептов."""
 
     author = models.ForeignKey(User,
@@ -48,6 +116,10 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(Tag,
                                   through='RecipeTag',)
     image = models.ImageField('Картинка', )
+    image_variants = models.JSONField('Уменьшенные копии картинки',
+                                      default=dict,
+                                      blank=True,
+                                      editable=False)
     name = models.CharField('Название',
                             max_length=200)
     text = models.TextField('Рецепт', )
@@ -58,10 +130,33 @@ class Recipe(models.Model):
                                          blank=False,)
     pub_date = models.DateTimeField('Дата публикации',
                                     auto_now_add=True)
+    favorites_count = models.PositiveIntegerField('Всего в Избранном',
+                                                  default=0,
+                                                  editable=False)
+    in_carts_count = models.PositiveIntegerField('Всего в Списках покупок',
+                                                 default=0,
+                                                 editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [models.Index(
+            fields=['-pub_date', '-id'],
+            name='recipe_pub_date_id_idx'
+        ), models.Index(
+            fields=['-favorites_count', '-id'],
+            name='recipe_favorites_count_idx'
+        ), models.Index(
+            fields=['-in_carts_count', '-pub_date'],
+            name='recipe_in_carts_count_idx'
+        ), models.Index(
+            fields=['author', '-pub_date', '-id'],
+            name='recipe_author_pub_date_idx'
+        )]
 
     def __str__(self) -> str:
         """Отобращает название в виде поля имя."""
@@ -89,6 +184,10 @@ class RecipeTag(models.Model):
             fields=['tag', 'recipe'],
             name='unique_recipe_tag'
         )]
+        indexes = [models.Index(
+            fields=['recipe', 'tag'],
+            name='recipetag_recipe_tag_idx'
+        )]
 
     def __str__(self) -> str:
         """Отобращает название в виде Рецепт/Тэг."""
@@ -118,6 +217,12 @@ class RecipeIngredient(models.Model):
             fields=['ingredient', 'recipe'],
             name='unique_recipe_ingredient'
         )]
+        # Покрывающий индекс для суммирования Списка покупок.
+        indexes = [models.Index(
+            fields=['recipe', 'ingredient'],
+            include=['amount'],
+            name='recipeingredient_cover_idx'
+        )]
 
     def __str__(self) -> str:
         """Отобращает название в виде Ингредиент/Рецепт/Количество."""
@@ -138,6 +243,8 @@ class Favorite(models.Model):
                                blank=True,
                                related_name='favorite',
                                )
+    created = models.DateTimeField('Дата добавления',
+                                   auto_now_add=True)
 
     class Meta:
         constraints = [models.UniqueConstraint(
@@ -161,6 +268,8 @@ class ShoppingCart(models.Model):
     recipe = models.ForeignKey(Recipe,
                                on_delete=models.CASCADE,
                                related_name='shoppingcart')
+    created = models.DateTimeField('Дата добавления',
+                                   auto_now_add=True)
 
     class Meta:
         constraints = [models.UniqueConstraint(
@@ -190,9 +299,62 @@ class Follow(models.Model):
             fields=['follower', 'author'],
             name='unique_following'
         )]
+        indexes = [models.Index(
+            fields=['follower', 'id'],
+            name='follow_follower_id_idx'
+        )]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
     def __str__(self) -> str:
         """Отобращает название в виде Подписчик/Автор."""
         return str(self.follower) + '/' + str(self.author)
+
+
+class RecipeRank(models.Model):
+    """
+    Рейтинг Рецепта.
+
+    Оценки popular и trending — логарифмы по основанию 2 суммы весов
+    событий (публикация, Избранное, Список покупок), затухающих с
+    периодом полураспада RECIPE_RANK_*_HALF_LIFE. Пересчитывается
+    командой rank. Строка с нулевыми оценками, ниже любого события после
+    начала отсчета, создается вместе с Рецептом.
+    """
+
+    recipe = models.OneToOneField(Recipe,
+                                  on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='rank',
+                                  verbose_name='Рецепт')
+    popular = models.FloatField('Популярность', default=0)
+    trending = models.FloatField('Набирает популярность', default=0)
+
+    class Meta:
+        verbose_name = 'Рейтинг Рецепта'
+        verbose_name_plural = 'Рейтинги Рецептов'
+        indexes = [
+            models.Index(fields=['-popular'], name='recipe_rank_popular_idx'),
+            models.Index(fields=['-trending'],
+                         name='recipe_rank_trending_idx'),
+        ]
+
+    def __str__(self) -> str:
+        """Отобращает название в виде Рецепт/популярность."""
+        return f'{self.recipe_id}/{self.popular:.2f}'
+
+
+class RankWatermark(models.Model):
+    """Последний учтенный в рейтинге id строк источника."""
+
+    source = models.CharField('Источник', max_length=50, primary_key=True)
+    last_id = models.BigIntegerField('Последний id', default=0)
+    refreshed = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Отметка рейтинга'
+        verbose_name_plural = 'Отметки рейтинга'
+
+    def __str__(self) -> str:
+        """Отобращает название в виде Источник/id."""
+        return f'{self.source}/{self.last_id}'
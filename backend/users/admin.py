@@ -8,8 +8,9 @@ User = get_user_model()
 class CustomUserAdmin(UserAdmin):
     """Кастомизация админки Пользователей."""
 
-    list_display = ('username', 'email', )
+    list_display = ('username', 'email', 'recipes_count', 'followers_count')
     search_fields = ('username', "email", )
+    readonly_fields = ('recipes_count', 'followers_count')
 
 
 admin.site.register(User, CustomUserAdmin)
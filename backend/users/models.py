@@ -1,10 +1,20 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from core.models import CounterFieldsMixin
 
-class CustomUser(AbstractUser):
+
+class CustomUser(CounterFieldsMixin, AbstractUser):
     """Кастомная модель Пользователей."""
 
     email = models.EmailField('email адрес', blank=False, unique=True)
     first_name = models.CharField('Имя', max_length=150, blank=False)
     last_name = models.CharField('Фамилия', max_length=150, blank=False)
+    recipes_count = models.PositiveIntegerField('Всего рецептов',
+                                                default=0,
+                                                editable=False)
+    followers_count = models.PositiveIntegerField('Всего подписчиков',
+                                                  default=0,
+                                                  editable=False)
+
+    counter_fields = ('recipes_count', 'followers_count')